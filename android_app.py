@@ -8,9 +8,7 @@ import os
 import sys
 import threading
 import time
-import json
 import mimetypes
-import re
 from urllib.parse import quote, unquote
 from pathlib import Path
 
@@ -34,6 +32,11 @@ from kivy.logger import Logger
 # Flask imports for embedded server
 from flask import Flask, render_template_string, request, Response, send_file, jsonify
 
+# Shared library index and streaming engine
+from library import LibraryIndex, LibraryWatcher
+from progress_store import ProgressFlusher, open_progress_store
+from streaming import file_response
+
 # Android-specific imports
 if platform == 'android':
     from android.permissions import request_permissions, Permission
@@ -41,15 +44,26 @@ if platform == 'android':
     from jnius import autoclass
     PythonActivity = autoclass('org.kivy.android.PythonActivity')
 
+VIDEO_EXTENSIONS = {
+    '.mp4', '.avi', '.mkv', '.mov', '.wmv',
+    '.flv', '.webm', '.m4v', '.3gp', '.mpg', '.mpeg'
+}
+
 class MovieStreamer:
     """Core movie streaming functionality"""
     
     def __init__(self):
         self.movies_folder = self.get_movies_folder()
-        self.watch_progress = {}
         self.progress_file = os.path.join(self.get_app_folder(), 'watch_progress.json')
         self.load_progress()
         
+        # Build the library index once and keep it current in the background
+        self.library = LibraryIndex(self.movies_folder, VIDEO_EXTENSIONS, sort_key=str)
+        if hasattr(self.watch_progress.store, 'update_catalog'):
+            self.library.subscribe(self.watch_progress.store.update_catalog)
+        self.library.load()
+        self.library_watcher = LibraryWatcher(self.library).start()
+        
         # Initialize Flask app
         self.app = Flask(__name__)
         self.app.secret_key = 'cinestream_mobile_secret_key_2025'
@@ -92,66 +106,41 @@ class MovieStreamer:
             return os.path.join(os.getcwd(), 'movies')
     
     def load_progress(self):
-        """Load watch progress from file"""
-        try:
-            if os.path.exists(self.progress_file):
-                with open(self.progress_file, 'r') as f:
-                    self.watch_progress = json.load(f)
-        except Exception as e:
-            Logger.error(f'Error loading progress: {e}')
-            self.watch_progress = {}
+        """Load watch progress; updates are coalesced and flushed in the background"""
+        backend = os.environ.get('PROGRESS_BACKEND', 'json')
+        database = os.path.join(self.get_app_folder(), 'cinestream.db')
+        self.watch_progress = ProgressFlusher(
+            open_progress_store(self.progress_file, backend, database)).start()
     
-    def save_progress(self):
-        """Save watch progress to file"""
+    def refresh_library(self):
+        """Rescan the movies folder into the library index"""
         try:
-            os.makedirs(os.path.dirname(self.progress_file), exist_ok=True)
-            with open(self.progress_file, 'w') as f:
-                json.dump(self.watch_progress, f, indent=2)
+            self.library.rebuild()
         except Exception as e:
-            Logger.error(f'Error saving progress: {e}')
+            Logger.error(f'Error scanning movies: {e}')
     
     def get_movies(self):
-        """Get list of movies from the movies folder"""
+        """Get list of movies from the library index"""
         movies = []
         
-        if not os.path.exists(self.movies_folder):
-            return movies
+        for entry in self.library.sorted_entries():
+            filename = entry.filename
             
-        video_extensions = {
-            '.mp4', '.avi', '.mkv', '.mov', '.wmv', 
-            '.flv', '.webm', '.m4v', '.3gp', '.mpg', '.mpeg'
-        }
-        
-        try:
-            for filename in os.listdir(self.movies_folder):
-                filepath = os.path.join(self.movies_folder, filename)
-                
-                if os.path.isfile(filepath):
-                    name, ext = os.path.splitext(filename)
-                    
-                    if ext.lower() in video_extensions:
-                        # Get file size
-                        size_bytes = os.path.getsize(filepath)
-                        size_gb = round(size_bytes / (1024**3), 2)
-                        
-                        # Get watch progress
-                        progress = self.watch_progress.get(filename, {})
-                        watch_percentage = progress.get('percentage', 0)
-                        
-                        movies.append({
-                            'name': name,
-                            'filename': filename,
-                            'size': size_gb,
-                            'watch_percentage': watch_percentage,
-                            'is_watched': watch_percentage > 90,
-                            'is_watching': 5 < watch_percentage < 90,
-                            'download_url': f'/download/{quote(filename)}'
-                        })
-                        
-        except Exception as e:
-            Logger.error(f'Error scanning movies: {e}')
+            # Get watch progress
+            progress = self.watch_progress.get(filename, {})
+            watch_percentage = progress.get('percentage', 0)
+            
+            movies.append({
+                'name': entry.name,
+                'filename': filename,
+                'size': entry.size_gb,
+                'watch_percentage': watch_percentage,
+                'is_watched': watch_percentage > 90,
+                'is_watching': 5 < watch_percentage < 90,
+                'download_url': f'/download/{quote(filename)}'
+            })
             
-        return sorted(movies, key=lambda x: x['name'])
+        return movies
     
     def setup_routes(self):
         """Setup Flask routes for the embedded server"""
@@ -161,15 +150,15 @@ class MovieStreamer:
             movies = self.get_movies()
             return self.render_mobile_homepage(movies)
         
-        @self.app.route('/player/<filename>')
+        @self.app.route('/player/<path:filename>')
         def player(filename):
             return self.render_mobile_player(filename)
         
-        @self.app.route('/stream/<filename>')
+        @self.app.route('/stream/<path:filename>')
         def stream_video(filename):
             return self.stream_video_file(filename)
         
-        @self.app.route('/download/<filename>')
+        @self.app.route('/download/<path:filename>')
         def download_movie(filename):
             return self.download_movie_file(filename)
         
@@ -612,8 +601,7 @@ class MovieStreamer:
     
     def render_mobile_player(self, filename):
         """Render mobile video player"""
-        movie_path = os.path.join(self.movies_folder, filename)
-        if not os.path.exists(movie_path):
+        if filename not in self.library:
             return "Movie not found", 404
         
         # Get watch progress
@@ -667,49 +655,14 @@ class MovieStreamer:
     def stream_video_file(self, filename):
         """Stream video file with range support"""
         try:
-            filepath = os.path.join(self.movies_folder, filename)
-            if not os.path.exists(filepath):
+            movie = self.library.get(filename)
+            if movie is None:
                 return "File not found", 404
+            filepath = movie.path
             
-            # Handle range requests for mobile streaming
-            range_header = request.headers.get('Range', None)
-            if not range_header:
-                return send_file(filepath)
-            
-            file_size = os.path.getsize(filepath)
-            byte_start = 0
-            byte_end = file_size - 1
-            
-            match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-            if match:
-                byte_start = int(match.group(1))
-                if match.group(2):
-                    byte_end = int(match.group(2))
-            
-            content_length = byte_end - byte_start + 1
-            
-            def generate():
-                with open(filepath, 'rb') as f:
-                    f.seek(byte_start)
-                    remaining = content_length
-                    chunk_size = 8192
-                    
-                    while remaining:
-                        read_size = min(chunk_size, remaining)
-                        data = f.read(read_size)
-                        if not data:
-                            break
-                        remaining -= len(data)
-                        yield data
-            
-            headers = {
-                'Content-Range': f'bytes {byte_start}-{byte_end}/{file_size}',
-                'Accept-Ranges': 'bytes',
-                'Content-Length': str(content_length),
-                'Content-Type': 'video/mp4',
-            }
-            
-            return Response(generate(), 206, headers)
+            # Ranges, validators and conditional requests
+            status, headers, body = file_response(request.environ, filepath, 'video/mp4')
+            return Response(body, status, headers, direct_passthrough=True)
             
         except Exception as e:
             Logger.error(f'Streaming error: {e}')
@@ -718,9 +671,9 @@ class MovieStreamer:
     def download_movie_file(self, filename):
         """Download movie file"""
         try:
-            filepath = os.path.join(self.movies_folder, filename)
-            if os.path.exists(filepath):
-                return send_file(filepath, as_attachment=True, download_name=filename)
+            movie = self.library.get(filename)
+            if movie is not None:
+                return send_file(movie.path, as_attachment=True, download_name=os.path.basename(movie.path))
             else:
                 return "File not found", 404
         except Exception as e:
@@ -738,17 +691,15 @@ class MovieStreamer:
             if filename and duration > 0:
                 percentage = (current_time / duration) * 100
                 
-                if filename not in self.watch_progress:
-                    self.watch_progress[filename] = {}
-                
-                self.watch_progress[filename].update({
+                progress = dict(self.watch_progress.get(filename, {}))
+                progress.update({
                     'current_time': current_time,
                     'duration': duration,
                     'percentage': percentage,
                     'last_watched': time.strftime('%Y-%m-%d %H:%M:%S')
                 })
                 
-                self.save_progress()
+                self.watch_progress.record(filename, progress)
             
             return jsonify({'status': 'success'})
         except Exception as e:
@@ -775,6 +726,10 @@ class CineStreamApp(App):
         # Create main layout
         return self.create_main_layout()
     
+    def on_stop(self):
+        """Persist pending watch progress when the app closes"""
+        self.streamer.watch_progress.stop()
+    
     def request_android_permissions(self):
         """Request necessary Android permissions"""
         permissions = [
@@ -954,6 +909,7 @@ class CineStreamApp(App):
     
     def refresh_movies(self, instance):
         """Refresh movies list"""
+        self.streamer.refresh_library()
         self.load_movies()
     
     def play_movie(self, filename):
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+CineStream asset pipeline
+Minified page bundles, content-hashed static URLs with long-lived caching
+and precompressed variants
+
+Usage: python assets.py build   (write static/dist/ ahead of deployment)
+       python assets.py icons fontawesome-webfont.svg   (regenerate css/icons.css)
+"""
+
+import os
+import re
+import sys
+import gzip
+import hashlib
+import mimetypes
+import logging
+import xml.etree.ElementTree as ET
+from urllib.parse import quote
+
+from flask import Response, abort
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# One year, the longest lifetime browsers honour
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Text assets worth compressing
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# Stored precompressed variants next to a file: name -> Content-Encoding
+STORED_ENCODINGS = {'.br': 'br', '.gz': 'gzip'}
+
+# One CSS and one JS bundle per page, built into static/dist/.
+# Page stylesheets reuse selectors with different rules, so pages are
+# not merged into a single site-wide bundle.
+BUNDLES = {
+    'dist/home.css': ['css/icons.css', 'mobile-player.css', 'css/home.css'],
+    'dist/play.css': ['css/icons.css', 'mobile-player.css', 'css/play.css'],
+    'dist/player.css': ['css/icons.css', 'mobile-player.css', 'css/player.css'],
+    'dist/play.js': ['cinema-controls.js', 'js/play.js'],
+    'dist/player.js': ['cinema-controls.js', 'js/player.js'],
+}
+
+# Icon classes used by the pages -> Font Awesome 4 (SIL OFL 1.1) glyph code
+# points. css/icons.css draws only these glyphs, as CSS masks, so pages do
+# not depend on the Font Awesome CDN stylesheet and web font.
+ICONS = {
+    'arrow-left': 0xf060,
+    'backward': 0xf04a,
+    'compress': 0xf066,
+    'download': 0xf019,
+    'expand': 0xf065,
+    'eye': 0xf06e,
+    'file-video': 0xf1c8,
+    'film': 0xf008,
+    'forward': 0xf04e,
+    'pause': 0xf04c,
+    'play': 0xf04b,
+    'sun': 0xf185,
+    'video': 0xf03d,
+    'volume-down': 0xf027,
+    'volume-mute': 0xf026,
+    'volume-up': 0xf028,
+}
+
+# Glyphs Font Awesome 4 lacks, drawn on top of a base glyph: name -> (path, advance)
+ICON_OVERLAYS = {
+    # A cross where the sound waves of volume-up would be
+    'volume-mute': ('M960 512l128 -128l128 128l128 -128l128 128l-128 128l128 128l-128 128'
+                    'l-128 -128l-128 128l-128 -128l128 -128z', 1664),
+}
+
+# Font Awesome 4 em box: 1792 units, baseline 256 units above the bottom
+_ICON_EM = 1792
+_ICON_ASCENT = 1536
+_ICON_CLASS = re.compile(r'\bfa-([a-z][a-z0-9-]*)')
+
+# Quoted strings and comments, matched together so comment markers inside
+# strings (e.g. URLs) are left alone
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+_JS_TOKENS = re.compile(
+    r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`)'
+    r'|/\*.*?\*/|(?<![:\\])//[^\n]*', re.S)
+
+
+def _strip(pattern, source):
+    """Drop comments matched by `pattern`, keeping string literals"""
+    return pattern.sub(lambda m: m.group(1) or '', source)
+
+
+def minify_css(source):
+    """Remove comments and redundant whitespace from a stylesheet"""
+    parts = []
+    # Split on strings so whitespace inside them is preserved
+    for i, chunk in enumerate(re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', _strip(_CSS_TOKENS, source))):
+        if i % 2:
+            parts.append(chunk)
+            continue
+        chunk = re.sub(r'\s+', ' ', chunk)
+        chunk = re.sub(r'\s*([{};,>])\s*', r'\1', chunk)
+        chunk = re.sub(r'\s*:\s*(?=[^{}]*[;}])', ':', chunk)
+        chunk = chunk.replace(';}', '}')
+        parts.append(chunk)
+    return ''.join(parts).strip() + '\n'
+
+
+def minify_js(source):
+    """Conservative JS minifier: drop comments, indentation and blank lines
+
+    Line breaks are kept so automatic semicolon insertion behaves exactly
+    as in the source; regex literals containing // are not expected in
+    the bundled files.
+    """
+    lines = (line.strip() for line in _strip(_JS_TOKENS, source).splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_bundles(folder, bundles=None):
+    """Concatenate, minify and precompress the page bundles into `folder`
+
+    Each bundle is written with stored .gz (and .br when brotli is
+    available) siblings. Bundles whose sources have not changed since the
+    last build are left alone.
+    """
+    for target, sources in (bundles or BUNDLES).items():
+        source_paths = [os.path.join(folder, *name.split('/')) for name in sources]
+        target_path = os.path.join(folder, *target.split('/'))
+        try:
+            newest_source = max(os.path.getmtime(path) for path in source_paths)
+            if os.path.exists(target_path) and os.path.getmtime(target_path) >= newest_source:
+                continue
+        except OSError as e:
+            logger.error(f"Cannot build {target}: {e}")
+            continue
+        texts = []
+        for path in source_paths:
+            with open(path, encoding='utf-8') as f:
+                texts.append(f.read())
+        if target.endswith('.css'):
+            body = minify_css('\n'.join(texts))
+        else:
+            # Separate files with ';' so concatenation cannot join statements
+            body = ';\n'.join(minify_js(text) for text in texts)
+        data = body.encode('utf-8')
+        try:
+            _write_atomic(target_path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(target_path + '.br', brotli.compress(data, quality=11))
+            # Written last, so a half-finished build is rebuilt next time
+            _write_atomic(target_path, data)
+        except OSError as e:
+            logger.error(f"Cannot write {target} (run 'python assets.py build' at deploy time): {e}")
+            continue
+        logger.info(f"Built {target}: {sum(map(len, texts))} -> {len(data)} bytes")
+
+
+def used_icons(root):
+    """Icon names referenced by the templates and page scripts under `root`"""
+    names = set()
+    for folder in ('templates', 'static'):
+        for dirpath, dirnames, filenames in os.walk(os.path.join(root, folder)):
+            dirnames[:] = [name for name in dirnames if name != 'dist']
+            for filename in filenames:
+                if filename.endswith(('.html', '.js')):
+                    with open(os.path.join(dirpath, filename), encoding='utf-8') as f:
+                        names.update(_ICON_CLASS.findall(f.read()))
+    return names
+
+
+def build_icon_css(font_path, output_path, names):
+    """Write CSS drawing the icons `names` from a Font Awesome 4 SVG font
+
+    Each icon becomes an SVG mask filled with currentColor, sized from the
+    glyph's advance width, so `<i class="fas fa-play">` keeps the colour
+    and metrics it had with the web font.
+    """
+    glyphs = {}
+    for glyph in ET.parse(font_path).iter('glyph'):
+        unicode = glyph.get('unicode')
+        if unicode and len(unicode) == 1:
+            glyphs[ord(unicode)] = (glyph.get('d', ''), int(glyph.get('horiz-adv-x', _ICON_EM)))
+
+    rules = []
+    for name in sorted(names):
+        code = ICONS.get(name)
+        if code is None or code not in glyphs:
+            logger.warning(f"No glyph for icon fa-{name}")
+            continue
+        path, advance = glyphs[code]
+        if name in ICON_OVERLAYS:
+            overlay, advance = ICON_OVERLAYS[name]
+            path += overlay
+        svg = (f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 -{_ICON_ASCENT} {advance} {_ICON_EM}'>"
+               f"<path transform='scale(1 -1)' d='{path}'/></svg>")
+        data_uri = 'data:image/svg+xml,' + quote(svg, safe=" =:/'-.,()")
+        rules.append(f'.fa-{name} {{\n'
+                     f'    width: {advance / _ICON_EM:.4f}em;\n'
+                     f'    --fa-icon: url("{data_uri}");\n'
+                     f'}}\n')
+
+    header = (
+        '/* Generated by `python assets.py icons`; do not edit.\n'
+        '   Icons from Font Awesome 4.7 by Dave Gandy (SIL OFL 1.1), drawn as\n'
+        '   masks in the current text colour. */\n'
+        '\n'
+        '.fas, .far, .fab {\n'
+        '    display: inline-block;\n'
+        '    height: 1em;\n'
+        f'    vertical-align: -{(_ICON_EM - _ICON_ASCENT) / _ICON_EM:.4f}em;\n'
+        '    background-color: currentColor;\n'
+        '    -webkit-mask: var(--fa-icon) center / contain no-repeat;\n'
+        '    mask: var(--fa-icon) center / contain no-repeat;\n'
+        '}\n'
+    )
+    _write_atomic(output_path, (header + '\n' + '\n'.join(rules)).encode('utf-8'))
+    logger.info(f"Wrote {len(rules)} icons to {output_path}")
+    return len(rules)
+
+
+class Asset:
+    """One static file held in memory with its precompressed variants"""
+
+    __slots__ = ('path', 'hashed_path', 'digest', 'mimetype', 'body', 'encodings')
+
+    def __init__(self, path, body, stored_encodings=None):
+        self.path = path
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(path)
+        self.hashed_path = f"{stem}.{self.digest}{ext}"
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.encodings = {}
+        if stored_encodings:
+            self.encodings = dict(stored_encodings)
+        elif self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            self.encodings['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.encodings['br'] = brotli.compress(body, quality=11)
+            # Keep only variants that are actually smaller
+            self.encodings = {name: data for name, data in self.encodings.items()
+                              if len(data) < len(body)}
+
+
+class AssetManifest:
+    """Fingerprinted view of a static folder
+
+    Every file is read and hashed once at startup. Templates link to
+    `asset_url(path)`, which returns the content-hashed URL; those URLs
+    never change meaning, so they are served with a one-year immutable
+    Cache-Control. Unhashed URLs still work with revalidation.
+    """
+
+    def __init__(self, folder, url_prefix='/static'):
+        self.folder = folder
+        self.url_prefix = url_prefix
+        self.assets = {}
+        self.by_hashed_path = {}
+        self.build()
+
+    def build(self):
+        """Read and fingerprint every file under the static folder"""
+        assets = {}
+        for root, _, names in os.walk(self.folder):
+            files = set(names)
+            for name in names:
+                if os.path.splitext(name)[1] in STORED_ENCODINGS or name.endswith('.tmp'):
+                    continue
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.folder).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    body = f.read()
+                # Prefer variants stored by build_bundles() over compressing here
+                stored = {}
+                for suffix, encoding in STORED_ENCODINGS.items():
+                    if name + suffix in files:
+                        with open(full_path + suffix, 'rb') as f:
+                            stored[encoding] = f.read()
+                assets[path] = Asset(path, body, stored)
+        self.assets = assets
+        self.by_hashed_path = {asset.hashed_path: asset for asset in assets.values()}
+        logger.info(f"Asset manifest: {len(assets)} files from {self.folder}")
+
+    def url(self, path):
+        """Fingerprinted URL for a static file, or the plain URL if unknown"""
+        asset = self.assets.get(path)
+        if asset is None:
+            return f"{self.url_prefix}/{path}"
+        return f"{self.url_prefix}/{asset.hashed_path}"
+
+    def response(self, request, path):
+        """Serve a static file, picking a precompressed variant when accepted"""
+        asset = self.by_hashed_path.get(path)
+        immutable = asset is not None
+        if asset is None:
+            asset = self.assets.get(path)
+        if asset is None:
+            abort(404)
+
+        body = asset.body
+        encoding = None
+        for name in ('br', 'gzip'):
+            if name in asset.encodings and request.accept_encodings[name] > 0:
+                body = asset.encodings[name]
+                encoding = name
+                break
+
+        response = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if asset.encodings:
+            response.vary.add('Accept-Encoding')
+        # Distinct validators per encoding, as the bytes differ
+        response.set_etag(f"{asset.digest}-{encoding}" if encoding else asset.digest)
+        if immutable:
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    root = os.path.dirname(os.path.abspath(__file__))
+    if len(sys.argv) == 2 and sys.argv[1] == 'build':
+        build_bundles(os.path.join(root, 'static'))
+    elif len(sys.argv) == 3 and sys.argv[1] == 'icons':
+        build_icon_css(sys.argv[2], os.path.join(root, 'static', 'css', 'icons.css'), used_icons(root))
+    else:
+        print('\n'.join(__doc__.strip().splitlines()[-2:]))
+        sys.exit(1)
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+CineStream asyncio server
+Serves /stream and /download from one event loop so thousands of open
+video connections do not each hold an OS thread; every other request is
+handed to the Flask app
+
+Usage: python async_server.py [port]
+"""
+
+import os
+import sys
+import socket
+import asyncio
+import logging
+import mimetypes
+from functools import partial
+from http import HTTPStatus
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, unquote_to_bytes
+
+from remux import remux_response
+from streaming import StreamRejected, admission, content_disposition, file_response
+
+logger = logging.getLogger(__name__)
+
+# Threads for blocking work: stat/open, buffered range reads, Flask pages
+ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", 16))
+
+# Seconds an idle keep-alive connection waits for its next request
+KEEPALIVE_TIMEOUT = float(os.environ.get("ASYNC_KEEPALIVE_TIMEOUT", 75))
+
+# Kernel send buffer for media connections. Auto-tuning grows it to
+# several MB per socket, which thousands of paused players would pin in
+# kernel memory; 256 KiB still fills a LAN link. 0 keeps the default.
+SEND_BUFFER = int(os.environ.get("ASYNC_SEND_BUFFER", 256 * 1024))
+
+# Bytes per sendfile() call for paced responses, between pacing waits
+PACED_SLICE = 256 * 1024
+
+# Longest request line or header line, and most header lines, accepted
+MAX_LINE_BYTES = 64 * 1024
+MAX_HEADERS = 100
+
+MEDIA_ROUTES = {'/stream/': 'stream', '/download/': 'download'}
+
+
+class BadRequest(Exception):
+    """Malformed HTTP request; the connection is closed after a 400"""
+
+
+class SendfileWrapper:
+    """wsgi.file_wrapper stand-in that hands the open file to the event loop
+
+    streaming.range_body() positions the file at the start of the range
+    and wraps it; the server then sends Content-Length bytes from there
+    with loop.sendfile(), which never blocks a thread. A paced response
+    sets `bucket`, and is then sent in slices with a wait for each.
+    """
+
+    honors_length = True
+    paces = True
+
+    def __init__(self, filelike, block_size=None):
+        self.filelike = filelike
+        self.bucket = None
+
+    def close(self):
+        self.filelike.close()
+
+
+class AsyncStreamServer:
+    """HTTP/1.1 server multiplexing long-lived range responses on one loop
+
+    `resolve(filename)` maps a /stream or /download path to a movie file
+    (or None); the optional `duration(filename)` gives its length in
+    seconds, for bitrate pacing; the optional `remux(path)` returns the
+    RemuxJob that replaces a /stream of the file, or None. Media bodies go
+    out with loop.sendfile(), or are read in the bounded executor chunk by
+    chunk when they cannot (multipart and TLS), so a client that stops
+    reading costs a coroutine and a socket, not a thread. All other
+    requests run the WSGI app in the executor.
+    """
+
+    def __init__(self, app, resolve, workers=None, duration=None, remux=None):
+        self.app = app
+        self.resolve = resolve
+        self.duration = duration
+        self.remux = remux
+        self.workers = workers or ASYNC_WORKERS
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='async-worker')
+        # Requests waiting for a stream slot block here, not in the main pool;
+        # one extra thread lets an overflowing request be rejected at once
+        self.queue_executor = ThreadPoolExecutor(max_workers=admission.queue_size + 1,
+                                                 thread_name_prefix='async-admission')
+        self.connections = 0
+        self.server = None
+
+    async def start(self, host='0.0.0.0', port=5000):
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=1024,
+                                                 limit=MAX_LINE_BYTES)
+        return self.server
+
+    async def serve_forever(self, host='0.0.0.0', port=5000):
+        server = await self.start(host, port)
+        logger.info(f"Async streaming server on {host}:{port} ({self.workers} workers)")
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until it closes"""
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEPALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    break
+                except (BadRequest, ValueError, asyncio.LimitOverrunError):
+                    await self._send_simple(writer, 400, "Bad request", False)
+                    break
+                if request is None:
+                    break
+                if not await self._dispatch(request, reader, writer):
+                    break
+        except (ConnectionError, OSError):
+            # Client went away mid-response
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _read_request(self, reader):
+        """(method, target, version, headers) or None at end of stream"""
+        line = await reader.readline()
+        while line in (b'\r\n', b'\n'):
+            # Stray line breaks between requests are allowed
+            line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            raise BadRequest(line)
+        method, target, version = parts
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n'):
+                break
+            if not line:
+                raise asyncio.IncompleteReadError(line, None)
+            if len(headers) >= MAX_HEADERS:
+                raise BadRequest("too many headers")
+            name, sep, value = line.decode('latin-1').partition(':')
+            if not sep:
+                raise BadRequest(line)
+            headers.append((name.strip(), value.strip()))
+        return method, target, version, headers
+
+    def _environ(self, request, body, writer):
+        method, target, version, headers = request
+        path, _, query = target.partition('?')
+        peer = writer.get_extra_info('peername') or ('', 0)
+        sockname = writer.get_extra_info('sockname') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': str(sockname[0]),
+            'SERVER_PORT': str(sockname[1]),
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': str(peer[0]),
+            'REMOTE_PORT': str(peer[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'https' if writer.get_extra_info('sslcontext') else 'http',
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers:
+            key = name.upper().replace('-', '_')
+            if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[key] = value
+                continue
+            key = 'HTTP_' + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def _dispatch(self, request, reader, writer):
+        """Answer one request; returns whether the connection stays open"""
+        method, target, version, headers = request
+        fields = {name.lower(): value for name, value in headers}
+        connection = fields.get('connection', '').lower()
+        keep_alive = 'close' not in connection if version == 'HTTP/1.1' else 'keep-alive' in connection
+        if 'transfer-encoding' in fields:
+            await self._send_simple(writer, 411, "Length required", False)
+            return False
+        try:
+            length = int(fields.get('content-length') or 0)
+        except ValueError:
+            await self._send_simple(writer, 400, "Bad request", False)
+            return False
+        body = await reader.readexactly(length) if length > 0 else b''
+        environ = self._environ(request, body, writer)
+
+        path = target.partition('?')[0]
+        for prefix, kind in MEDIA_ROUTES.items():
+            if path.startswith(prefix) and method in ('GET', 'HEAD'):
+                filename = unquote(path[len(prefix):])
+                return await self._serve_media(kind, filename, environ, writer, keep_alive)
+        await self._serve_wsgi(environ, writer, keep_alive)
+        return keep_alive
+
+    async def _write_head(self, writer, status, headers, keep_alive):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        lines.extend(f"{name}: {value}" for name, value in headers
+                     if name.lower() != 'connection')
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    async def _send_simple(self, writer, status, text, keep_alive, extra_headers=()):
+        data = text.encode('utf-8')
+        headers = [('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', str(len(data)))]
+        headers.extend(extra_headers)
+        await self._write_head(writer, status, headers, keep_alive)
+        writer.write(data)
+        await writer.drain()
+
+    async def _serve_media(self, kind, filename, environ, writer, keep_alive):
+        """Answer a /stream or /download; returns whether the connection stays open"""
+        loop = asyncio.get_running_loop()
+        path = await loop.run_in_executor(self.executor, self.resolve, filename)
+        if path is None:
+            await self._send_simple(writer, 404, "Movie not found", keep_alive)
+            return keep_alive
+        content_type = mimetypes.guess_type(path)[0] or 'video/mp4'
+        job = None
+        if kind == 'stream' and self.remux is not None:
+            job = await loop.run_in_executor(self.executor, self.remux, path)
+            if job is not None:
+                content_type = 'video/mp4'
+                if job.complete:
+                    path, job = job.output, None
+        environ['wsgi.file_wrapper'] = SendfileWrapper
+        client = environ['REMOTE_ADDR']
+        slot = admission.try_admit(client)
+        if slot is None:
+            try:
+                slot = await loop.run_in_executor(self.queue_executor, admission.admit, client)
+            except StreamRejected as e:
+                await self._send_simple(writer, 503, "Server busy, try again shortly", keep_alive,
+                                        [('Retry-After', str(e.retry_after))])
+                return keep_alive
+        try:
+            if job is not None:
+                # A seek past the bytes written so far waits for the job
+                status, headers, body = await loop.run_in_executor(
+                    self.executor, partial(remux_response, environ, job, on_close=slot.release))
+            else:
+                duration = None
+                if self.duration is not None:
+                    duration = await loop.run_in_executor(self.executor, self.duration, filename)
+                status, headers, body = await loop.run_in_executor(
+                    self.executor, partial(file_response, environ, path, content_type,
+                                           priority=kind, duration=duration,
+                                           on_close=slot.release))
+        except FileNotFoundError:
+            slot.release()
+            await self._send_simple(writer, 404, "Movie not found", keep_alive)
+            return keep_alive
+        except BaseException:
+            slot.release()
+            raise
+        if kind == 'download':
+            headers['Content-Disposition'] = content_disposition(os.path.basename(path))
+        sock = writer.get_extra_info('socket')
+        if SEND_BUFFER and sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        if 'Content-Length' not in headers and not isinstance(body, bytes):
+            # A live remux has no length yet; closing the connection ends it
+            keep_alive = False
+
+        try:
+            await self._write_head(writer, status, headers.items(), keep_alive)
+            if environ['REQUEST_METHOD'] == 'HEAD':
+                return keep_alive
+            if isinstance(body, SendfileWrapper):
+                f = body.filelike
+                count = int(headers['Content-Length'])
+                # Counted as aborted unless the whole range goes out
+                f.delivered = False
+                if body.bucket is not None:
+                    await self._send_paced(writer, f, f.tell(), count, body.bucket)
+                elif count:
+                    await loop.sendfile(writer.transport, f, f.tell(), count)
+                f.delivered = True
+            elif isinstance(body, bytes):
+                writer.write(body)
+                await writer.drain()
+            else:
+                # Multipart or TLS: blocking reads in the executor, one chunk at a time
+                chunks = iter(body)
+                while True:
+                    chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                    if chunk is None:
+                        break
+                    writer.write(chunk)
+                    await writer.drain()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return keep_alive
+
+    async def _send_paced(self, writer, f, offset, count, bucket):
+        """sendfile() in slices, waiting for the bucket's credit before each"""
+        loop = asyncio.get_running_loop()
+        bucket.start()
+        try:
+            while count > 0:
+                size = min(PACED_SLICE, count)
+                wait = bucket.delay(size)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await loop.sendfile(writer.transport, f, offset, size)
+                offset += size
+                count -= size
+        finally:
+            bucket.stop()
+
+    def _call_wsgi(self, environ):
+        """Run the WSGI app to completion (executor thread)"""
+        response = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(None, 1)[0])
+            response['headers'] = headers
+            return written.append
+
+        result = self.app(environ, start_response)
+        try:
+            written.extend(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], b''.join(written)
+
+    async def _serve_wsgi(self, environ, writer, keep_alive):
+        loop = asyncio.get_running_loop()
+        status, headers, body = await loop.run_in_executor(self.executor, self._call_wsgi, environ)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            # No body was produced, so the app's Content-Length stands
+            headers = [(name, value) for name, value in headers
+                       if name.lower() != 'transfer-encoding']
+            await self._write_head(writer, status, headers, keep_alive)
+            return
+        # The body is complete, so it always gets an exact Content-Length
+        headers = [(name, value) for name, value in headers
+                   if name.lower() not in ('content-length', 'transfer-encoding')]
+        headers.append(('Content-Length', str(len(body))))
+        await self._write_head(writer, status, headers, keep_alive)
+        if body:
+            writer.write(body)
+            await writer.drain()
+
+
+def serve(app, resolve, host='0.0.0.0', port=5000, workers=None, duration=None, remux=None):
+    """Run the asyncio server until interrupted"""
+    server = AsyncStreamServer(app, resolve, workers, duration, remux)
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown(wait=False)
+        server.queue_executor.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    from app import app, media_duration, media_path, remux_job
+
+    serve(app, media_path, port=int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+          duration=media_duration, remux=remux_job)
@@ -1,11 +1,15 @@
 from flask import Flask, render_template_string, send_file, jsonify, request, Response
 import os
 import mimetypes
-import re
 import json
 import time
 from urllib.parse import quote
 import socket
+import sys
+
+# Share the range engine with the main server in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from streaming import file_response
 
 app = Flask(__name__)
 
@@ -1303,74 +1307,13 @@ def stream_video(filename):
     if not os.path.exists(movie_path):
         return "Movie not found", 404
     
-    # Get file info
-    file_size = os.path.getsize(movie_path)
-    
-    # Handle range requests for video seeking
-    range_header = request.headers.get('Range', None)
-    if not range_header:
-        # No range request, send entire file
-        def generate():
-            with open(movie_path, 'rb') as f:
-                while True:
-                    chunk = f.read(8192)
-                    if not chunk:
-                        break
-                    yield chunk
-        
-        # Determine MIME type
-        mime_type = mimetypes.guess_type(movie_path)[0] or 'application/octet-stream'
-        
-        response = Response(generate(), mimetype=mime_type)
-        response.headers['Accept-Ranges'] = 'bytes'
-        response.headers['Content-Length'] = str(file_size)
-        return response
-    
-    # Parse range header
-    byte_start = 0
-    byte_end = file_size - 1
-    
-    match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-    if match:
-        byte_start = int(match.group(1))
-        if match.group(2):
-            byte_end = int(match.group(2))
-    
-    # Ensure valid range
-    if byte_start >= file_size:
-        return "Range not satisfiable", 416
-    
-    if byte_end >= file_size:
-        byte_end = file_size - 1
-    
-    content_length = byte_end - byte_start + 1
-    
-    def generate_chunk():
-        with open(movie_path, 'rb') as f:
-            f.seek(byte_start)
-            remaining = content_length
-            while remaining:
-                chunk_size = min(8192, remaining)
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                remaining -= len(chunk)
-                yield chunk
-    
     # Determine MIME type
     mime_type = mimetypes.guess_type(movie_path)[0] or 'application/octet-stream'
     
-    response = Response(generate_chunk(), 
-                      status=206,
-                      mimetype=mime_type,
-                      direct_passthrough=True)
-    
-    response.headers['Content-Range'] = f'bytes {byte_start}-{byte_end}/{file_size}'
-    response.headers['Accept-Ranges'] = 'bytes'
-    response.headers['Content-Length'] = str(content_length)
-    response.headers['Cache-Control'] = 'no-cache'
-    
-    return response
+    # Ranges (suffix, multi-range, 416), validators and conditional
+    # requests are handled by the shared engine
+    status, headers, body = file_response(request.environ, movie_path, mime_type)
+    return Response(body, status=status, headers=headers, direct_passthrough=True)
 
 @app.route('/download/<filename>')
 def download_movie(filename):
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Idle stream load test
+Opens many /stream connections that read the response headers and then
+stop reading, like paused players, and reports the server's threads,
+open sockets and memory for the threaded Flask server and the asyncio
+server (async_server.py). Linux only (reads /proc).
+
+Usage: python benchmarks/async_stream_load.py [streams] [modes...]
+"""
+
+import os
+import sys
+import time
+import shutil
+import socket
+import resource
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'threaded': "import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    'asyncio': ("import app, async_server; "
+                "async_server.serve(app.app, app.media_path, host='127.0.0.1', port={port})"),
+}
+
+
+def raise_fd_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+def process_stats(pid):
+    """(threads, sockets, rss_mb) of a process"""
+    threads = rss_kb = 0
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('Threads:'):
+                threads = int(line.split()[1])
+            elif line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+    sockets = 0
+    for fd in os.listdir(f'/proc/{pid}/fd'):
+        try:
+            if os.readlink(f'/proc/{pid}/fd/{fd}').startswith('socket:'):
+                sockets += 1
+        except OSError:
+            pass
+    return threads, sockets, rss_kb / 1024
+
+
+def open_idle_stream(port, filename):
+    """Start a stream, read its headers and then stop reading"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Small window, as a paused player's full buffer would advertise
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect(('127.0.0.1', port))
+    sock.sendall(f"GET /stream/{filename} HTTP/1.1\r\nHost: localhost\r\nRange: bytes=0-\r\n\r\n".encode())
+    head = b''
+    while b'\r\n\r\n' not in head:
+        data = sock.recv(1024)
+        if not data:
+            raise RuntimeError("Server closed the stream")
+        head += data
+    if b' 206 ' not in head.split(b'\r\n', 1)[0]:
+        raise RuntimeError(head.split(b'\r\n', 1)[0].decode())
+    return sock
+
+
+def page_latency(port):
+    """Seconds to fetch the home page while the streams are open"""
+    start = time.perf_counter()
+    with socket.create_connection(('127.0.0.1', port), timeout=30) as sock:
+        sock.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+        while sock.recv(65536):
+            pass
+    return time.perf_counter() - start
+
+
+def run(mode, streams, folder, port):
+    env = dict(os.environ, MOVIES_FOLDER=folder, LIBRARY_WATCH='0',
+               PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    server = subprocess.Popen([sys.executable, '-c', SERVERS[mode].format(port=port)],
+                              cwd=folder, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    clients = []
+    try:
+        wait_for_port(port)
+        baseline = process_stats(server.pid)
+        started = time.perf_counter()
+        for _ in range(streams):
+            clients.append(open_idle_stream(port, 'movie.mp4'))
+        opened = time.perf_counter() - started
+        time.sleep(1)
+        threads, sockets, rss = process_stats(server.pid)
+        latency = page_latency(port)
+        print(f"{mode:<9} {len(clients):>8} {threads:>8} {sockets:>8} {rss:>9.1f} "
+              f"{rss - baseline[2]:>10.1f} {opened:>8.2f} {latency * 1000:>9.1f}")
+    finally:
+        for sock in clients:
+            sock.close()
+        server.terminate()
+        server.wait()
+
+
+def main():
+    streams = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    modes = sys.argv[2:] or ['threaded', 'asyncio']
+    raise_fd_limit(streams * 2 + 256)
+
+    folder = tempfile.mkdtemp(prefix='cinestream-load-')
+    # Sparse 2 GB file: far more than the socket buffers of every stream hold
+    with open(os.path.join(folder, 'movie.mp4'), 'wb') as f:
+        f.truncate(2 * 1024 ** 3)
+
+    print(f"{streams} idle streams per mode")
+    print(f"{'mode':<9} {'streams':>8} {'threads':>8} {'sockets':>8} {'RSS MB':>9} "
+          f"{'+RSS MB':>10} {'open s':>8} {'page ms':>9}")
+    try:
+        for i, mode in enumerate(modes):
+            run(mode, streams, folder, 5600 + i)
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
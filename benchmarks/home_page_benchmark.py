@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Home page benchmark
+Requests per second for / with a synthetic library, comparing the old
+render_template_string path (inline CSS, compiled on every request) with
+the precompiled templates/home.html.
+
+Usage: python benchmarks/home_page_benchmark.py [movies] [requests]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def build_library(folder, count):
+    """Create `count` empty movie files"""
+    for i in range(count):
+        open(os.path.join(folder, f"Movie {i:05d}.mp4"), 'wb').close()
+
+
+def legacy_source():
+    """Rebuild the old single-string template with its CSS inlined"""
+    with open(os.path.join(ROOT, 'templates', 'home.html')) as f:
+        source = f.read()
+    css = ''
+    for name in ('mobile-player.css', 'css/home.css'):
+        with open(os.path.join(ROOT, 'static', *name.split('/'))) as f:
+            css += f.read()
+    link = '<link rel="stylesheet" href="{{ asset_url(\'dist/home.css\') }}">'
+    return source.replace(link, f"<style>\n{css}</style>")
+
+
+def measure(client, path, requests):
+    client.get(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        assert response.status_code == 200
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    folder = tempfile.mkdtemp(prefix='cinestream-home-')
+    os.environ['MOVIES_FOLDER'] = folder
+    os.environ['LIBRARY_WATCH'] = '0'
+    build_library(folder, count)
+    try:
+        import logging
+        logging.disable(logging.INFO)
+        import app as cinestream
+        from flask import render_template_string
+
+        source = legacy_source()
+
+        @cinestream.app.route('/legacy-home')
+        def legacy_home():
+            return render_template_string(source, movies=cinestream.get_movies(),
+                                          local_ip=cinestream.get_local_ip())
+
+        client = cinestream.app.test_client()
+        before = measure(client, '/legacy-home', requests)
+        after = measure(client, '/', requests)
+        print(f"{count} movies, {requests} requests")
+        print(f"render_template_string: {before:8.1f} req/s")
+        print(f"precompiled template:   {after:8.1f} req/s ({after / before:.1f}x)")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Library scan benchmark
+Builds a synthetic tree of movie files and compares a per-file-stat
+os.walk baseline with the LibraryIndex scanner, serial and threaded.
+Reports total time and time until the first movie is available.
+
+Usage: python benchmarks/library_scan_benchmark.py [files] [per_dir] [workers] [latency_ms]
+
+latency_ms adds a sleep to every directory listing to mimic a NAS mount.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library import LibraryIndex
+
+EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v'}
+
+
+def add_listing_latency(latency):
+    """Make every os.scandir call (and so os.walk) wait `latency` seconds"""
+    real_scandir = os.scandir
+
+    def slow_scandir(path='.'):
+        time.sleep(latency)
+        return real_scandir(path)
+
+    os.scandir = slow_scandir
+
+
+def build_tree(root, files, per_dir):
+    """Create `files` small files spread over nested directories"""
+    exts = ['.mp4', '.mkv', '.avi', '.srt', '.nfo']
+    for i in range(files):
+        folder = os.path.join(root, f"genre{i // (per_dir * 10)}", f"show{i // per_dir}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"movie{i}{exts[i % len(exts)]}"), 'wb') as f:
+            f.write(b'\0' * (i % 64))
+
+
+def walk_baseline(root):
+    """os.walk plus an extension check and getsize per file, like get_movies() did"""
+    found = []
+    first = None
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if any(name.lower().endswith(ext) for ext in EXTENSIONS):
+                path = os.path.join(folder, name)
+                found.append((name, os.path.getsize(path)))
+                if first is None:
+                    first = time.perf_counter()
+    return found, first
+
+
+def index_scan(root, workers):
+    """LibraryIndex.iter_scan with the given number of workers"""
+    index = LibraryIndex(root, EXTENSIONS, workers=workers)
+    found = []
+    first = None
+    for entry in index.iter_scan():
+        found.append(entry)
+        if first is None:
+            first = time.perf_counter()
+    return found, first
+
+
+def measure(label, fn):
+    # Run once to warm the dentry cache, then time
+    fn()
+    start = time.perf_counter()
+    found, first = fn()
+    total = time.perf_counter() - start
+    first_ms = (first - start) * 1000 if first else float('nan')
+    print(f"{label:<22} {len(found):>8} {total * 1000:>10.1f} {first_ms:>14.1f}")
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    per_dir = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    latency_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 0
+
+    root = tempfile.mkdtemp(prefix='cinestream-scan-')
+    try:
+        print(f"Building {files} files, {per_dir} per directory in {root}")
+        build_tree(root, files, per_dir)
+        if latency_ms:
+            print(f"Adding {latency_ms} ms per directory listing")
+            add_listing_latency(latency_ms / 1000)
+        print(f"{'scanner':<22} {'movies':>8} {'total ms':>10} {'first ms':>14}")
+        measure("os.walk + getsize", lambda: walk_baseline(root))
+        measure("scandir, 1 worker", lambda: index_scan(root, 1))
+        measure(f"scandir, {workers} workers", lambda: index_scan(root, workers))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Streaming engine benchmark
+Compares the old 8 KiB generator with the buffered, mmap and sendfile
+paths of streaming.py. Each mode pushes one range over a local socket pair
+while a reader thread drains it, and reports throughput, sender CPU time
+and how many new bytes objects (and MB copied into them) the body made.
+
+Usage: python benchmarks/stream_benchmark.py [size_mb] [streams]
+"""
+
+import os
+import sys
+import socket
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming import FileRange, MappedRange, FileHandleCache, sendfile_range
+
+
+def legacy_generator(path, start, length):
+    """The generator app.stream_movie used before the streaming engine"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        chunk_size = 8192
+        while remaining:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def drain(sock, total):
+    """Read and discard everything the sender writes"""
+    received = 0
+    while received < total:
+        data = sock.recv(4 * 1024 * 1024)
+        if not data:
+            break
+        received += len(data)
+
+
+def make_body(mode, path, length, handles):
+    if mode == 'legacy':
+        return legacy_generator(path, 0, length)
+    if mode == 'buffered':
+        return FileRange(path, 0, length, handles=handles)
+    return MappedRange(path, 0, length, handles=handles, views=mode == 'mmap-views')
+
+
+def run_stream(mode, path, length, handles):
+    """Send one range over a socket pair; returns (seconds, cpu_seconds, allocs, copied)"""
+    sender, receiver = socket.socketpair()
+    reader = threading.Thread(target=drain, args=(receiver, length))
+    reader.start()
+    allocs = copied = 0
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    if mode == 'sendfile':
+        sendfile_range(sender.fileno(), path, 0, length)
+    else:
+        for chunk in make_body(mode, path, length, handles):
+            if isinstance(chunk, bytes):
+                allocs += 1
+                copied += len(chunk)
+            sender.sendall(chunk)
+    cpu = time.thread_time() - cpu
+    sender.shutdown(socket.SHUT_WR)
+    reader.join()
+    wall = time.perf_counter() - wall
+    sender.close()
+    receiver.close()
+    return wall, cpu, allocs, copied
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    streams = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    length = size_mb * 1024 * 1024
+
+    with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as f:
+        block = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            f.write(block)
+        path = f.name
+
+    modes = ['legacy', 'buffered']
+    if hasattr(os, 'pread'):
+        modes += ['mmap', 'mmap-views']
+    if hasattr(os, 'sendfile'):
+        modes.append('sendfile')
+    # Private handle cache so the map is reused across runs like in the server
+    handles = FileHandleCache(idle_timeout=0) if hasattr(os, 'pread') else None
+
+    print(f"{size_mb} MB range, {streams} runs per mode")
+    print(f"{'mode':<11} {'MB/s':>10} {'CPU ms/stream':>15} {'CPU ms/GB':>12} "
+          f"{'allocs':>8} {'MB copied':>10}")
+    try:
+        for mode in modes:
+            results = [run_stream(mode, path, length, handles) for _ in range(streams)]
+            wall = sum(r[0] for r in results) / streams
+            cpu = sum(r[1] for r in results) / streams
+            print(f"{mode:<11} {size_mb / wall:>10.1f} {cpu * 1000:>15.1f} "
+                  f"{cpu * 1000 * 1024 / size_mb:>12.1f} {results[0][2]:>8} "
+                  f"{results[0][3] / 1024 / 1024:>10.1f}")
+    finally:
+        if handles is not None:
+            handles.clear()
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -23,7 +23,7 @@ version = 1.0.0
 
 # (list) Application requirements
 # comma separated e.g. requirements = sqlite3,kivy
-requirements = python3,kivy==2.1.0,flask==2.3.3,werkzeug==2.3.7,jinja2==3.1.2,markupsafe==2.1.3,click==8.1.7,itsdangerous==2.1.2,plyer,android
+requirements = python3,sqlite3,kivy==2.1.0,flask==2.3.3,werkzeug==2.3.7,jinja2==3.1.2,markupsafe==2.1.3,click==8.1.7,itsdangerous==2.1.2,plyer,android
 
 # (str) Presplash of the application
 # presplash.filename = %(source.dir)s/presplash.png
@@ -0,0 +1,453 @@
+"""
+CineStream library index
+In-memory catalog of the movies folder, built once and shared by all routes
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# Worker threads for the directory walk; network shares benefit from more
+SCAN_WORKERS = int(os.environ.get("LIBRARY_SCAN_WORKERS", 8))
+
+
+class MovieEntry:
+    """One movie file in the library
+
+    `filename` is the path relative to the movies folder with '/'
+    separators, so movies in subfolders get unique keys.
+    """
+
+    __slots__ = ('filename', 'name', 'path', 'size', 'mtime', 'sort_key')
+
+    def __init__(self, filename, path, size, mtime, sort_key):
+        self.filename = filename
+        self.name = os.path.splitext(filename.rsplit('/', 1)[-1])[0]
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.sort_key = sort_key(self.name)
+
+    @property
+    def size_gb(self):
+        return round(self.size / (1024 * 1024 * 1024), 2)
+
+
+class LibraryIndex:
+    """Catalog of movie files keyed by filename
+
+    Lookups by filename are a dict hit, and the name-sorted view is kept
+    as a tuple that is only rebuilt after the catalog changes. Every change
+    bumps `generation` so callers can cache anything derived from it.
+    """
+
+    def __init__(self, folder, extensions, sort_key=str.lower, workers=None):
+        self.folder = folder
+        self.extensions = frozenset(ext.lower() for ext in extensions)
+        self.sort_key = sort_key
+        self.workers = workers or SCAN_WORKERS
+        self.generation = 0
+        self.directories = (folder,)
+        self._entries = {}
+        self._sorted = ()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, filename):
+        return filename in self._entries
+
+    def is_movie(self, filename):
+        """Check the extension against the allowed video formats"""
+        return os.path.splitext(filename)[1].lower() in self.extensions
+
+    def get(self, filename):
+        """Look up a movie by filename, or None if it is not in the library"""
+        return self._entries.get(filename)
+
+    def subscribe(self, callback):
+        """Call `callback(added, removed, present)` after every change
+
+        `added` are new or updated entries and `removed` dropped filenames.
+        After a full build `present` is the set of all filenames, so
+        mirrors of the catalog can drop rows for files that vanished while
+        the server was down; otherwise it is None.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, added, removed, present=None):
+        for callback in self._listeners:
+            try:
+                callback(added, removed, present)
+            except Exception as e:
+                logger.error(f"Library listener failed: {e}")
+
+    def sorted_entries(self):
+        """All movies sorted by name"""
+        return self._sorted
+
+    def make_entry(self, filename, path, stat_result):
+        """Build an entry from an os.stat / DirEntry.stat result"""
+        return MovieEntry(filename, path, stat_result.st_size, stat_result.st_mtime, self.sort_key)
+
+    def relative_name(self, path):
+        """Library key for a path inside the movies folder"""
+        return os.path.relpath(path, self.folder).replace(os.sep, '/')
+
+    def _scan_directory(self, path, prefix):
+        """List one directory, returning (entries, subdirectories)
+
+        `prefix` is the directory's library key prefix ('' or 'A/B/').
+        """
+        entries = []
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for dir_entry in it:
+                    name = dir_entry.name
+                    try:
+                        if dir_entry.is_dir(follow_symlinks=False):
+                            if not name.startswith('.'):
+                                subdirs.append((dir_entry.path, prefix + name + '/'))
+                        elif self.is_movie(name) and dir_entry.is_file():
+                            # DirEntry caches its stat result; on Windows it is free
+                            entries.append(self.make_entry(prefix + name, dir_entry.path, dir_entry.stat()))
+                    except OSError as e:
+                        logger.warning(f"Skipping {dir_entry.path}: {e}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Cannot scan {path}: {e}")
+        return entries, subdirs
+
+    def iter_scan(self, directories=None):
+        """Walk the movies folder recursively, yielding entries as they are found
+
+        Each directory is listed in a worker thread and its subdirectories
+        are queued as soon as they are seen, so slow network shares are
+        walked in parallel and the first results arrive before the walk
+        finishes. Visited directories are recorded in `directories` when the
+        generator is given a list.
+        """
+        if directories is not None:
+            directories.append(self.folder)
+        if self.workers <= 1:
+            # Plain depth-first walk, no thread hand-off
+            stack = [(self.folder, '')]
+            while stack:
+                entries, subdirs = self._scan_directory(*stack.pop())
+                stack.extend(subdirs)
+                if directories is not None:
+                    directories.extend(path for path, _ in subdirs)
+                yield from entries
+            return
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='library-scan')
+        try:
+            pending = {pool.submit(self._scan_directory, self.folder, '')}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entries, subdirs = future.result()
+                    for subdir in subdirs:
+                        pending.add(pool.submit(self._scan_directory, *subdir))
+                    if directories is not None:
+                        directories.extend(path for path, _ in subdirs)
+                    yield from entries
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def scan(self):
+        """Walk the movies folder and return a {filename: entry} dict"""
+        directories = []
+        entries = {entry.filename: entry for entry in self.iter_scan(directories)}
+        self.directories = tuple(directories)
+        return entries
+
+    def load(self, batch_size=500):
+        """Build the catalog, publishing results in batches as the walk runs
+
+        Lets the home page show the first movies of a large library before
+        the whole tree has been read. Entries that disappeared since the
+        last build are dropped once the walk completes.
+        """
+        directories = []
+        seen = set()
+        batch = []
+        for entry in self.iter_scan(directories):
+            seen.add(entry.filename)
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                self.apply(batch)
+                batch = []
+        self.apply(batch, [filename for filename in self._entries if filename not in seen])
+        self.directories = tuple(directories)
+        # Publish even when the folder is empty so generation moves off 0
+        if self.generation == 0:
+            with self._lock:
+                self._publish()
+        self._notify((), (), frozenset(seen))
+        logger.info(f"Library index built: {len(self)} movies in {self.folder}")
+
+    def rebuild(self):
+        """Replace the whole catalog with a fresh scan"""
+        entries = self.scan()
+        with self._lock:
+            removed = [filename for filename in self._entries if filename not in entries]
+            self._entries = entries
+            self._publish()
+        self._notify(list(entries.values()), removed, frozenset(entries))
+        logger.info(f"Library index built: {len(entries)} movies in {self.folder}")
+
+    def sync(self):
+        """Rescan the folder and apply only what changed"""
+        scanned = self.scan()
+        current = self._entries
+        added = [entry for filename, entry in scanned.items()
+                 if filename not in current
+                 or current[filename].size != entry.size
+                 or current[filename].mtime != entry.mtime]
+        removed = [filename for filename in current if filename not in scanned]
+        return self.apply(added, removed)
+
+    def refresh(self, filenames):
+        """Re-stat individual files and add, update or drop them"""
+        added = []
+        removed = []
+        for filename in filenames:
+            path = os.path.join(self.folder, *filename.split('/'))
+            try:
+                st = os.stat(path)
+            except OSError:
+                removed.append(filename)
+                continue
+            if self.is_movie(filename) and os.path.isfile(path):
+                added.append(self.make_entry(filename, path, st))
+            else:
+                removed.append(filename)
+        return self.apply(added, removed)
+
+    def apply(self, added=(), removed=()):
+        """Apply a batch of changes: entries to add or replace, filenames to drop"""
+        with self._lock:
+            dropped = [filename for filename in removed
+                       if self._entries.pop(filename, None) is not None]
+            added = list(added)
+            for entry in added:
+                self._entries[entry.filename] = entry
+            changed = bool(dropped or added)
+            if changed:
+                self._publish()
+        if changed:
+            self._notify(added, dropped)
+        return changed
+
+    def _publish(self):
+        """Rebuild the sorted view and bump the generation (lock held)"""
+        self._sorted = tuple(sorted(self._entries.values(), key=lambda e: e.sort_key))
+        self.generation += 1
+
+
+# inotify constants from <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class Inotify:
+    """Minimal ctypes binding for inotify"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}
+        self.paths = set()
+
+    def add_watch(self, path):
+        """Watch one directory (not recursive)"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {path}')
+        self.watches[wd] = path
+        self.paths.add(path)
+
+    def read(self, timeout):
+        """Wait up to `timeout` seconds and return (directory, mask, name) events"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            directory = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                # The kernel dropped this watch (directory removed)
+                self.paths.discard(self.watches.pop(wd, None))
+            events.append((directory, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """Background thread that keeps a LibraryIndex in step with the disk
+
+    Uses inotify on every directory of the library where available and
+    falls back to polling directory mtimes. Changed files are collected for
+    `batch_delay` seconds and applied to the index in one batch, so a bulk
+    copy of many files costs one re-sort instead of one per file. Added or
+    removed subdirectories trigger a diff of the whole tree.
+    """
+
+    def __init__(self, index, poll_interval=5.0, batch_delay=0.5, use_inotify=True, resync_every=12):
+        self.index = index
+        self.poll_interval = poll_interval
+        self.resync_every = resync_every
+        self.batch_delay = batch_delay
+        self.use_inotify = use_inotify
+        self._load = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, load=False):
+        """Start watching in a daemon thread, optionally building the index first"""
+        if self._thread is None:
+            self._load = load
+            self._thread = threading.Thread(target=self._run, name='library-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching and wait for the thread to exit"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+
+    def _run(self):
+        inotify = None
+        try:
+            if self._load:
+                self.index.load()
+            if self.use_inotify and sys.platform.startswith('linux'):
+                try:
+                    inotify = Inotify()
+                    inotify.add_watch(self.index.folder)
+                except (OSError, AttributeError) as e:
+                    logger.info(f"inotify unavailable ({e}), polling {self.index.folder}")
+                    if inotify is not None:
+                        inotify.close()
+                        inotify = None
+            if inotify is not None:
+                self._watch_inotify(inotify)
+            else:
+                self._watch_polling()
+        except Exception as e:
+            logger.error(f"Library watcher stopped: {e}")
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def _add_watches(self, inotify):
+        """Watch any library directories that are not watched yet"""
+        for directory in self.index.directories:
+            if directory not in inotify.paths:
+                try:
+                    inotify.add_watch(directory)
+                except OSError as e:
+                    logger.debug(f"Cannot watch {directory}: {e}")
+
+    def _watch_inotify(self, inotify):
+        self._add_watches(inotify)
+        pending = set()
+        full_sync = False
+        deadline = None
+        while not self._stop.is_set():
+            timeout = self.poll_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            for directory, mask, name in inotify.read(timeout):
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and directory == self.index.folder:
+                    logger.warning(f"{self.index.folder} was moved or deleted, polling instead")
+                    self.index.sync()
+                    return self._watch_polling()
+                if mask & (IN_Q_OVERFLOW | IN_ISDIR):
+                    # Lost events or a subtree came or went; diff the whole tree
+                    full_sync = True
+                elif directory is not None and name:
+                    pending.add(self.index.relative_name(os.path.join(directory, name)))
+                else:
+                    continue
+                if deadline is None:
+                    deadline = time.monotonic() + self.batch_delay
+            if deadline is not None and time.monotonic() >= deadline:
+                if full_sync:
+                    self._apply_sync()
+                    self._add_watches(inotify)
+                else:
+                    self._apply(pending)
+                pending = set()
+                full_sync = False
+                deadline = None
+
+    def _watch_polling(self):
+        last_mtimes = self._directory_mtimes()
+        polls = 0
+        while not self._stop.wait(self.poll_interval):
+            polls += 1
+            mtimes = self._directory_mtimes()
+            # Directory mtimes miss files that are still growing, so diff
+            # the whole tree every `resync_every` polls as well
+            if mtimes != last_mtimes or polls % self.resync_every == 0:
+                self._apply_sync()
+                last_mtimes = self._directory_mtimes()
+
+    def _directory_mtimes(self):
+        mtimes = {}
+        for directory in self.index.directories:
+            try:
+                mtimes[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                mtimes[directory] = None
+        return mtimes
+
+    def _apply_sync(self):
+        if self.index.sync():
+            logger.debug(f"Library updated: {len(self.index)} movies")
+
+    def _apply(self, filenames):
+        if self.index.refresh(filenames):
+            logger.debug(f"Library updated ({len(filenames)} changes): {len(self.index)} movies")
@@ -0,0 +1,357 @@
+"""
+CineStream progress store
+Watch progress persisted as a JSON snapshot plus an append-only journal
+"""
+
+import os
+import json
+import signal
+import atexit
+import threading
+import logging
+from collections.abc import Mapping
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background flushes of coalesced progress updates
+FLUSH_INTERVAL = float(os.environ.get("PROGRESS_FLUSH_INTERVAL", 5))
+
+# Compact the journal into the snapshot once it grows past this many bytes
+JOURNAL_COMPACT_BYTES = int(os.environ.get("PROGRESS_JOURNAL_COMPACT_BYTES", 1024 * 1024))
+
+
+def open_progress_store(json_path, backend='json', database=None):
+    """Open the progress store for a backend name
+
+    Every backend is a mapping of filename -> progress record with
+    record() / record_many(); database backends also mirror the library
+    catalog through update_catalog().
+
+    'json' is the snapshot + journal pair next to `json_path`. 'sqlite'
+    keeps progress in the file `database`; 'sqlalchemy' in the database
+    URL `database`, shared by all workers and nodes. Database backends
+    import `json_path` the first time they start empty.
+    """
+    if backend == 'sqlite':
+        from sqlite_store import SQLiteStore
+
+        store = SQLiteStore(database or os.path.join(os.path.dirname(os.path.abspath(json_path)), 'cinestream.db'))
+    elif backend == 'sqlalchemy':
+        from sqlalchemy_store import SQLAlchemyStore
+
+        if not database:
+            raise ValueError("The sqlalchemy progress backend needs a database URL")
+        store = SQLAlchemyStore(database)
+    else:
+        if backend != 'json':
+            logger.warning(f"Unknown progress backend {backend!r}, using json")
+        return ProgressJournal(json_path)
+    if not len(store) and os.path.exists(json_path):
+        migrate_json_progress(json_path, store)
+    return store
+
+
+def migrate_json_progress(json_path, store):
+    """Copy progress from watch_progress.json (and its journal) into a store
+
+    Returns the number of titles copied. The JSON files are left in place.
+    """
+    journal = ProgressJournal(json_path)
+    try:
+        items = list(journal.items())
+    finally:
+        journal.close()
+    store.record_many(items)
+    logger.info(f"Migrated {len(items)} progress records from {json_path}")
+    return len(items)
+
+
+class ProgressJournal(Mapping):
+    """Read-only mapping of filename -> progress record, updated via record()
+
+    Each update appends one JSON line to `<path>.journal`, so the cost of a
+    save does not grow with the number of titles. When the journal passes
+    `compact_bytes` a background thread writes a fresh snapshot to `path`
+    (write to temp file, then atomic rename) and starts a new journal.
+    On startup the snapshot is loaded and the journals are replayed; a torn
+    last line from a crash is ignored.
+    """
+
+    def __init__(self, path, compact_bytes=None, fsync=False):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.compacting_path = path + '.journal.compacting'
+        self.compact_bytes = compact_bytes or JOURNAL_COMPACT_BYTES
+        self.fsync = fsync
+        self._data = {}
+        self._lock = threading.Lock()
+        self._journal = None
+        self._journal_size = 0
+        self._compacting = False
+        self.load()
+
+    def __getitem__(self, filename):
+        return self._data[filename]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def load(self):
+        """Load the snapshot and replay any journals left from the last run"""
+        data = {}
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading progress snapshot {self.path}: {e}")
+        for journal in (self.compacting_path, self.journal_path):
+            self._replay(journal, data)
+        if os.path.exists(self.compacting_path):
+            # A compaction was interrupted; finish it before the name is reused
+            if self._write_snapshot(data):
+                os.remove(self.compacting_path)
+        with self._lock:
+            self._data = data
+            self._open_journal()
+
+    def _replay(self, journal, data):
+        try:
+            with open(journal, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        data[entry['filename']] = entry['progress']
+                    except (ValueError, KeyError, TypeError):
+                        # A torn write from a crash can only be the last line
+                        logger.warning(f"Skipping bad progress journal line in {journal}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error replaying progress journal {journal}: {e}")
+
+    def _open_journal(self):
+        """Open the journal for appending (lock held)"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.journal_path)), exist_ok=True)
+        self._journal = open(self.journal_path, 'a+', encoding='utf-8')
+        self._journal_size = self._journal.tell()
+        if self._journal_size:
+            # Terminate a torn last line so the next record starts cleanly
+            with open(self.journal_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._journal.write('\n')
+                    self._journal_size += 1
+
+    def record(self, filename, progress):
+        """Store the progress for one title and append it to the journal"""
+        self.record_many([(filename, progress)])
+
+    def record_many(self, items):
+        """Store several (filename, progress) pairs with a single journal flush
+
+        The pairs are kept only once the journal write succeeds; an OSError
+        is logged and re-raised so the caller can retry them.
+        """
+        items = list(items)
+        lines = []
+        for filename, progress in items:
+            lines.append(json.dumps({'filename': filename, 'progress': progress}, separators=(',', ':')) + '\n')
+        if not lines:
+            return
+        data = ''.join(lines)
+        with self._lock:
+            try:
+                if self._journal is None:
+                    self._open_journal()
+                self._journal.write(data)
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+                self._journal_size += len(data)
+            except OSError as e:
+                logger.error(f"Error writing progress journal: {e}")
+                # Reopened on the next write, which ends any torn line
+                self._close_journal()
+                raise
+            for filename, progress in items:
+                self._data[filename] = progress
+            start_compaction = self._journal_size >= self.compact_bytes and not self._compacting
+            if start_compaction:
+                self._compacting = True
+        if start_compaction:
+            threading.Thread(target=self.compact, name='progress-compact', daemon=True).start()
+
+    def compact(self):
+        """Write a snapshot of all progress and drop the replayed journal"""
+        with self._lock:
+            self._compacting = True
+            snapshot = dict(self._data)
+            try:
+                if self._journal is not None:
+                    self._journal.close()
+                os.replace(self.journal_path, self.compacting_path)
+            except OSError as e:
+                logger.error(f"Error rotating progress journal: {e}")
+            finally:
+                self._open_journal()
+        try:
+            if self._write_snapshot(snapshot) and os.path.exists(self.compacting_path):
+                os.remove(self.compacting_path)
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _write_snapshot(self, snapshot):
+        """Atomically replace the snapshot file; returns True on success"""
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError as e:
+            logger.error(f"Error writing progress snapshot: {e}")
+            return False
+
+    def _close_journal(self):
+        """Close the journal, ignoring a failed final flush (lock held)"""
+        journal, self._journal = self._journal, None
+        if journal is not None:
+            try:
+                journal.close()
+            except OSError as e:
+                logger.error(f"Error closing progress journal: {e}")
+
+    def close(self):
+        """Flush and close the journal"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+class ProgressFlusher(Mapping):
+    """Write-coalescing front for a progress store
+
+    record() only updates an in-memory dict of dirty titles and returns, so
+    the /save-progress handler never touches the disk. A background thread
+    hands the latest record per title to the underlying store every
+    `interval` seconds, and once more at interpreter exit or on SIGTERM.
+    Reads see pending updates before they are flushed.
+
+    `generation` changes whenever any progress changes, including changes
+    written by other nodes when the store reports its own generation.
+    """
+
+    def __init__(self, store, interval=None):
+        self.store = store
+        self.interval = FLUSH_INTERVAL if interval is None else interval
+        self._generation = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __getitem__(self, filename):
+        pending = self._pending.get(filename)
+        if pending is not None:
+            return pending
+        return self.store[filename]
+
+    def __iter__(self):
+        seen = set(self._pending)
+        yield from seen
+        for filename in self.store:
+            if filename not in seen:
+                yield filename
+
+    def __len__(self):
+        return len(set(self._pending).union(self.store))
+
+    @property
+    def generation(self):
+        return (self._generation, getattr(self.store, 'generation', 0))
+
+    def record(self, filename, progress):
+        """Remember the latest progress for a title; persisted on the next flush"""
+        with self._lock:
+            self._pending[filename] = progress
+            self._generation += 1
+
+    def flush(self):
+        """Persist all dirty titles to the underlying store
+
+        If the store raises, the titles are put back for the next flush,
+        except where a newer record has arrived meanwhile, and the error
+        is re-raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            try:
+                self.store.record_many(list(pending.items()))
+            except Exception:
+                with self._lock:
+                    for filename, progress in pending.items():
+                        self._pending.setdefault(filename, progress)
+                raise
+            return len(pending)
+
+    def start(self, handle_signals=True):
+        """Start the flush thread and register exit/SIGTERM flushing"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='progress-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+            if handle_signals:
+                self._install_sigterm_handler()
+        return self
+
+    def stop(self):
+        """Stop the flush thread and write out anything still pending"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 1)
+        self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing progress on shutdown: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing progress: {e}")
+
+    def _install_sigterm_handler(self):
+        """Turn SIGTERM into an orderly exit so the atexit hook flushes
+
+        The handler runs on the main thread, possibly inside `record()`
+        while it holds `_lock`, so it must not flush itself. It hands the
+        signal to the previous handler (gunicorn workers then leave their
+        loop and exit normally) or, where the default action would kill
+        the process outright, raises SystemExit instead.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        try:
+            previous = signal.getsignal(signal.SIGTERM)
+
+            def on_sigterm(signum, frame):
+                if callable(previous):
+                    previous(signum, frame)
+                elif previous != signal.SIG_IGN:
+                    raise SystemExit(128 + signum)
+
+            signal.signal(signal.SIGTERM, on_sigterm)
+        except (ValueError, OSError, AttributeError) as e:
+            logger.debug(f"Cannot install SIGTERM handler: {e}")
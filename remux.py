@@ -0,0 +1,366 @@
+"""
+CineStream remux
+Containers browsers cannot play (MKV, AVI, WMV, FLV) rewritten as fragmented
+MP4 by a local ffmpeg with stream copy, cached on disk
+"""
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+import logging
+
+from streaming import DisconnectMonitor, file_handles, parse_size
+
+logger = logging.getLogger(__name__)
+
+# Set REMUX=0 to serve every container byte for byte
+REMUX_ENABLED = os.environ.get("REMUX", "1") != "0"
+
+# ffmpeg executable, found on PATH by default
+FFMPEG = os.environ.get("FFMPEG", "ffmpeg")
+
+# Extensions rewritten as MP4
+REMUX_EXTENSIONS = {ext.strip().lower() for ext in
+                    os.environ.get("REMUX_EXTENSIONS", ".mkv,.avi,.wmv,.flv").split(',') if ext.strip()}
+
+# Directory for remuxed files, its byte budget, and most remuxes at once
+REMUX_CACHE_DIR = os.environ.get("REMUX_CACHE_DIR",
+                                 os.path.join(tempfile.gettempdir(), 'cinestream-remux'))
+REMUX_CACHE_SIZE = os.environ.get("REMUX_CACHE_SIZE", "20g")
+REMUX_MAX_JOBS = int(os.environ.get("REMUX_MAX_JOBS", 2))
+
+# Seconds a request waits for ffmpeg's first output before falling back
+# to the original file
+REMUX_START_TIMEOUT = float(os.environ.get("REMUX_START_TIMEOUT", 15))
+
+# Bytes read from ffmpeg, and sent to clients, per block
+REMUX_BLOCK_SIZE = 256 * 1024
+
+# Single byte range with a known start; the only form that can be served
+# from a remux whose final length is not known yet
+_LIVE_RANGE = re.compile(r'^\s*bytes\s*=\s*(\d+)-(\d*)\s*$', re.IGNORECASE)
+
+
+def ffmpeg_command(ffmpeg, source):
+    """Stream-copy the first video and audio track into fragmented MP4 on stdout
+
+    Subtitles and data tracks are dropped; MP4 cannot carry most of the
+    formats MKV uses for them. Fragmenting at keyframes with an empty
+    moov lets the output be played while it is still being written.
+    """
+    return [
+        ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-i', source,
+        '-map', '0:v:0', '-map', '0:a:0?', '-sn', '-dn',
+        '-c', 'copy',
+        '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+        '-f', 'mp4', 'pipe:1',
+    ]
+
+
+class RemuxJob:
+    """One ffmpeg remux of a source file into the cache
+
+    A thread copies ffmpeg's output into `<key>.mp4.part` and renames it to
+    `<key>.mp4` when ffmpeg succeeds. Readers follow the part file while it
+    grows (see RemuxStream), so every viewer of the title shares one run.
+    """
+
+    def __init__(self, source, output, ffmpeg=None, on_complete=None):
+        self.source = source
+        self.output = output
+        self.part = output + '.part'
+        self.ffmpeg = ffmpeg or FFMPEG
+        self.on_complete = on_complete
+        self.size = 0
+        self.complete = False
+        self.failed = False
+        self.started_at = None
+        self._changed = threading.Condition()
+
+    @classmethod
+    def cached(cls, source, output):
+        """Stand-in job for an output already in the cache"""
+        job = cls(source, output)
+        job.size = os.path.getsize(output)
+        job.complete = True
+        return job
+
+    @property
+    def finished(self):
+        return self.complete or self.failed
+
+    def start(self):
+        self.started_at = time.monotonic()
+        threading.Thread(target=self._run, name='remux', daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            with tempfile.TemporaryFile() as errors, open(self.part, 'wb') as out:
+                process = subprocess.Popen(ffmpeg_command(self.ffmpeg, self.source),
+                                           stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                           stderr=errors)
+                with process.stdout:
+                    while True:
+                        data = process.stdout.read1(REMUX_BLOCK_SIZE)
+                        if not data:
+                            break
+                        out.write(data)
+                        out.flush()
+                        with self._changed:
+                            self.size += len(data)
+                            self._changed.notify_all()
+                status = process.wait()
+                if status != 0:
+                    errors.seek(0)
+                    message = errors.read().decode('utf-8', 'replace').strip()
+                    raise RuntimeError(message.splitlines()[-1] if message else f"exit status {status}")
+            with self._changed:
+                # Renamed under the lock so open() never misses both names
+                os.replace(self.part, self.output)
+                self.complete = True
+                self._changed.notify_all()
+            logger.info(f"Remuxed {self.source} ({self.size} bytes in "
+                        f"{time.monotonic() - self.started_at:.1f}s)")
+            if self.on_complete is not None:
+                self.on_complete()
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Cannot remux {self.source}, serving it as is: {e}")
+            try:
+                os.remove(self.part)
+            except OSError:
+                pass
+            with self._changed:
+                self.failed = True
+                self._changed.notify_all()
+
+    def wait(self, offset, timeout=None):
+        """Wait until output past `offset` exists or the job ends; True if it does"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.size > offset or self.finished, timeout)
+            return self.size > offset
+
+    def started(self, timeout=None):
+        """Wait for ffmpeg's first output; False if the remux failed or stalled"""
+        if self.complete:
+            return True
+        self.wait(0, REMUX_START_TIMEOUT if timeout is None else timeout)
+        return self.size > 0 and not self.failed
+
+    def open(self):
+        """Open the output for reading, wherever it is right now"""
+        with self._changed:
+            path = self.output if self.complete else self.part
+            return open(path, 'rb', buffering=0)
+
+
+class RemuxStream:
+    """Iterable body that follows a running remux from byte `start`
+
+    Blocks that ffmpeg has not produced yet are waited for; the body ends
+    at `end` (exclusive) or when the job does. `on_close` runs once when
+    the body is closed.
+    """
+
+    def __init__(self, job, on_close=None, monitor=None, start=0, end=None):
+        self.job = job
+        self.on_close = on_close
+        self.monitor = monitor
+        self.start = start
+        self.end = end
+        self._file = None
+
+    def __iter__(self):
+        self._file = self.job.open()
+        offset = self.start
+        self._file.seek(offset)
+        while self.end is None or offset < self.end:
+            size = REMUX_BLOCK_SIZE if self.end is None else min(REMUX_BLOCK_SIZE, self.end - offset)
+            data = self._file.read(size)
+            if data:
+                offset += len(data)
+                yield data
+                continue
+            if self.monitor is not None and self.monitor.gone():
+                break
+            if not self.job.wait(offset, timeout=1) and self.job.finished:
+                break
+        self.close()
+
+    def close(self):
+        """Close the output file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+def live_range(header, job, timeout=None):
+    """(start, end) of a Range request that a running remux can serve, or None
+
+    Only a single range with a start is served, clamped to the bytes
+    written so far, since the final length is unknown. A start just past
+    them is waited for up to `timeout` seconds. `bytes=0-` gets None: the
+    live stream from the beginning plays better than what is written yet.
+    """
+    match = _LIVE_RANGE.match(header or '')
+    if match is None:
+        return None
+    start = int(match.group(1))
+    last = int(match.group(2)) if match.group(2) else None
+    if (start == 0 and last is None) or (last is not None and last < start):
+        return None
+    if not job.wait(start, REMUX_START_TIMEOUT if timeout is None else timeout):
+        return None
+    written = job.size
+    end = written - 1 if last is None else min(last, written - 1)
+    return start, end
+
+
+def remux_response(environ, job, on_close=None):
+    """Status, headers and body for a title whose remux is still running
+
+    A seek within the part already remuxed gets 206 with
+    `Content-Range: bytes a-b/*` (see live_range); anything else gets the
+    output as it is written, from byte 0. Neither may be cached: once the
+    job completes, requests get the finished copy with ETags instead.
+    """
+    headers = {
+        'Content-Type': 'video/mp4',
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'no-store',
+    }
+    head = environ.get('REQUEST_METHOD') == 'HEAD'
+    monitor = DisconnectMonitor.for_environ(environ)
+    byte_range = live_range(environ.get('HTTP_RANGE'), job)
+    if byte_range is not None:
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/*'
+        headers['Content-Length'] = str(end - start + 1)
+        if not head:
+            return 206, headers, RemuxStream(job, on_close, monitor, start, end + 1)
+        status = 206
+    else:
+        if not head:
+            return 200, headers, RemuxStream(job, on_close, monitor)
+        status = 200
+    if on_close is not None:
+        on_close()
+    return status, headers, b''
+
+
+class RemuxCache:
+    """Remuxed copies of titles on disk, keyed by the source file's identity
+
+    job(path) returns the finished copy, the running job for it, or starts
+    one, so a second viewer or a seek reuses the work. A replaced source
+    gets a new key. Finished copies beyond `max_bytes` are deleted least
+    recently used (by atime, which job() updates) first; failed sources
+    are remembered until they change.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None, max_jobs=None, extensions=None,
+                 ffmpeg=None):
+        self.cache_dir = cache_dir or REMUX_CACHE_DIR
+        self.max_bytes = parse_size(REMUX_CACHE_SIZE) if max_bytes is None else max_bytes
+        self.max_jobs = REMUX_MAX_JOBS if max_jobs is None else max_jobs
+        self.extensions = REMUX_EXTENSIONS if extensions is None else extensions
+        self.ffmpeg = ffmpeg or FFMPEG
+        self._jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Part files from a previous run can never complete
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.part'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def wants(self, path):
+        """Check whether a file's container should be remuxed"""
+        return os.path.splitext(path)[1].lower() in self.extensions
+
+    def key(self, path, st):
+        identity = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{st.st_ino}"
+        return hashlib.sha1(identity.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def job(self, path):
+        """RemuxJob for a title, or None to serve the original file
+
+        Raises OSError when the source cannot be read.
+        """
+        if not self.wants(path):
+            return None
+        st = os.stat(path)
+        key = self.key(path, st)
+        output = os.path.join(self.cache_dir, key + '.mp4')
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.failed:
+                return None
+            if job is not None and not job.complete:
+                return job
+            try:
+                # Recently used copies are the last to be evicted. Only the
+                # atime moves: the mtime is part of the ETag and of the
+                # handle and chunk cache identity
+                cached = os.stat(output)
+                os.utime(output, ns=(time.time_ns(), cached.st_mtime_ns))
+                return job or RemuxJob.cached(path, output)
+            except FileNotFoundError:
+                pass
+            running = sum(1 for j in self._jobs.values() if not j.finished)
+            if running >= self.max_jobs:
+                logger.info(f"{running} remuxes running, serving {path} as is")
+                return None
+            job = self._jobs[key] = RemuxJob(path, output, self.ffmpeg, on_complete=self.evict)
+        return job.start()
+
+    def evict(self):
+        """Delete least recently used copies while over max_bytes"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.mp4'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_atime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                # Windows cannot delete a file that is being served
+                logger.debug(f"Cannot evict {path}: {e}")
+                continue
+            if file_handles is not None:
+                file_handles.invalidate(path)
+            total -= size
+            logger.info(f"Evicted remuxed copy {path}")
+
+
+def open_remux_cache():
+    """The remux cache, or None when disabled or ffmpeg is not installed"""
+    if not REMUX_ENABLED:
+        return None
+    if shutil.which(FFMPEG) is None:
+        logger.info(f"{FFMPEG} not found; MKV/AVI/WMV/FLV are served without remuxing")
+        return None
+    try:
+        return RemuxCache()
+    except (OSError, ValueError) as e:
+        logger.warning(f"Remux cache unavailable: {e}")
+        return None
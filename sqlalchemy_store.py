@@ -0,0 +1,205 @@
+"""
+CineStream SQLAlchemy store
+Shared watch progress and library catalog for multi-worker / multi-node deployments
+
+Works with any SQLAlchemy URL; PostgreSQL (psycopg2) in production and
+sqlite:/// for local testing.
+"""
+
+import json
+import time
+import threading
+import logging
+from collections.abc import Mapping
+
+from sqlalchemy import (
+    BigInteger, Column, Float, Index, MetaData, String, Table, Text,
+    create_engine, delete, select,
+)
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+progress_table = Table(
+    'progress', metadata,
+    Column('filename', String(1024), primary_key=True),
+    Column('position', Float, nullable=False, default=0),
+    Column('duration', Float, nullable=False, default=0),
+    Column('percentage', Float, nullable=False, default=0),
+    Column('updated_at', Float, nullable=False),
+    Column('data', Text, nullable=False),
+    Index('progress_updated', 'updated_at'),
+    Index('progress_percentage', 'percentage', 'updated_at'),
+)
+
+movies_table = Table(
+    'movies', metadata,
+    Column('filename', String(1024), primary_key=True),
+    Column('name', String(1024), nullable=False),
+    Column('size', BigInteger, nullable=False),
+    Column('mtime', Float, nullable=False),
+    Column('added_at', Float, nullable=False),
+    Index('movies_added', 'added_at'),
+)
+
+
+def _number(value):
+    """Coerce a progress field to float for the indexed columns"""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class SQLAlchemyStore(Mapping):
+    """Progress store and movie catalog in a shared SQL database
+
+    Same interface as ProgressJournal and SQLiteStore, so it plugs into
+    ProgressFlusher. Every worker and node reads and writes the same rows.
+    Reads are served from a snapshot of the progress table that is
+    reloaded with one query once it is older than `cache_ttl` seconds, so
+    the home page does not issue a query per movie.
+    """
+
+    def __init__(self, url, cache_ttl=2.0, pool_size=5, max_overflow=10, **engine_options):
+        if url.startswith('postgres://'):
+            # Heroku/Replit style URLs; SQLAlchemy only accepts postgresql://
+            url = 'postgresql://' + url[len('postgres://'):]
+        self.url = url
+        self.cache_ttl = cache_ttl
+        if not url.startswith('sqlite'):
+            engine_options.setdefault('pool_size', pool_size)
+            engine_options.setdefault('max_overflow', max_overflow)
+        self.engine = create_engine(url, pool_pre_ping=True, **engine_options)
+        metadata.create_all(self.engine)
+        self._cache = {}
+        self._cache_loaded = 0.0
+        self._cache_lock = threading.Lock()
+        self._generation = 0
+
+    def _snapshot(self):
+        """Progress for all titles, reloaded when older than cache_ttl"""
+        if time.monotonic() - self._cache_loaded > self.cache_ttl:
+            with self._cache_lock:
+                if time.monotonic() - self._cache_loaded > self.cache_ttl:
+                    with self.engine.connect() as conn:
+                        rows = conn.execute(select(progress_table.c.filename, progress_table.c.data))
+                        cache = {filename: json.loads(data) for filename, data in rows}
+                    if cache != self._cache:
+                        self._generation += 1
+                    self._cache = cache
+                    self._cache_loaded = time.monotonic()
+        return self._cache
+
+    @property
+    def generation(self):
+        """Changes when the shared progress table changed, seen at most cache_ttl late"""
+        self._snapshot()
+        return self._generation
+
+    def __getitem__(self, filename):
+        return self._snapshot()[filename]
+
+    def __iter__(self):
+        return iter(self._snapshot())
+
+    def __len__(self):
+        return len(self._snapshot())
+
+    def _upsert(self, table, rows, update_columns):
+        """Insert rows, updating `update_columns` on primary key conflicts"""
+        dialect = self.engine.dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            insert = None
+        key = table.c.filename
+        with self.engine.begin() as conn:
+            if insert is None:
+                # Portable fallback: replace the rows inside one transaction
+                conn.execute(delete(table).where(key.in_([row['filename'] for row in rows])))
+                conn.execute(table.insert(), rows)
+                return
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[key],
+                set_={column: stmt.excluded[column] for column in update_columns},
+            )
+            conn.execute(stmt, rows)
+
+    def record(self, filename, progress):
+        """Upsert the progress for one title"""
+        self.record_many([(filename, progress)])
+
+    def record_many(self, items):
+        """Upsert many (filename, progress) pairs in one statement batch"""
+        now = time.time()
+        items = list(items)
+        rows = []
+        for filename, progress in items:
+            last_watched = progress.get('last_watched')
+            rows.append({
+                'filename': filename,
+                'position': _number(progress.get('current_time')),
+                'duration': _number(progress.get('duration')),
+                'percentage': _number(progress.get('percentage')),
+                'updated_at': last_watched if isinstance(last_watched, (int, float)) else now,
+                'data': json.dumps(progress, separators=(',', ':')),
+            })
+        if rows:
+            self._upsert(progress_table, rows,
+                         ('position', 'duration', 'percentage', 'updated_at', 'data'))
+        # Cached only once written; a failed upsert raises before this
+        for filename, progress in items:
+            self._cache[filename] = progress
+
+    def _query_progress(self, where, limit):
+        stmt = (select(progress_table.c.filename, progress_table.c.data)
+                .where(where)
+                .order_by(progress_table.c.updated_at.desc())
+                .limit(limit))
+        with self.engine.connect() as conn:
+            return [(filename, json.loads(data)) for filename, data in conn.execute(stmt)]
+
+    def continue_watching(self, limit=20):
+        """Partly watched titles, most recently watched first"""
+        percentage = progress_table.c.percentage
+        return self._query_progress((percentage > 5) & (percentage < 90), limit)
+
+    def watched(self, limit=100):
+        """Finished titles, most recently watched first"""
+        return self._query_progress(progress_table.c.percentage > 90, limit)
+
+    def recently_added(self, limit=20):
+        """Movies that appeared in the library most recently, newest first"""
+        stmt = select(movies_table).order_by(movies_table.c.added_at.desc()).limit(limit)
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(stmt)]
+
+    def update_catalog(self, added=(), removed=(), present=None):
+        """Apply library index changes to the movies table
+
+        Matches LibraryIndex.subscribe(); when `present` is given, rows for
+        files no longer in the library are dropped as well.
+        """
+        now = time.time()
+        rows = [{'filename': e.filename, 'name': e.name, 'size': e.size,
+                 'mtime': e.mtime, 'added_at': now} for e in added]
+        removed = list(removed)
+        if present is not None:
+            with self.engine.connect() as conn:
+                removed.extend(filename for (filename,) in conn.execute(select(movies_table.c.filename))
+                               if filename not in present)
+        if rows:
+            self._upsert(movies_table, rows, ('name', 'size', 'mtime'))
+        if removed:
+            with self.engine.begin() as conn:
+                for i in range(0, len(removed), 500):
+                    batch = removed[i:i + 500]
+                    conn.execute(delete(movies_table).where(movies_table.c.filename.in_(batch)))
+
+    def close(self):
+        self.engine.dispose()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+CineStream SQLite store
+Watch progress and library metadata in a local SQLite database (WAL mode)
+
+Usage: python sqlite_store.py migrate [watch_progress.json] [cinestream.db]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections.abc import Mapping
+
+from progress_store import migrate_json_progress
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS progress (
+    filename     TEXT PRIMARY KEY,
+    position     REAL NOT NULL DEFAULT 0,
+    duration     REAL NOT NULL DEFAULT 0,
+    percentage   REAL NOT NULL DEFAULT 0,
+    updated_at   REAL NOT NULL,
+    data         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS progress_updated ON progress (updated_at);
+CREATE INDEX IF NOT EXISTS progress_percentage ON progress (percentage, updated_at);
+
+CREATE TABLE IF NOT EXISTS movies (
+    filename TEXT PRIMARY KEY,
+    name     TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime    REAL NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS movies_added ON movies (added_at);
+"""
+
+# Statements are module constants so sqlite3's statement cache reuses them
+UPSERT_PROGRESS = """
+INSERT INTO progress (filename, position, duration, percentage, updated_at, data)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (filename) DO UPDATE SET
+    position = excluded.position,
+    duration = excluded.duration,
+    percentage = excluded.percentage,
+    updated_at = excluded.updated_at,
+    data = excluded.data
+"""
+SELECT_ALL_PROGRESS = "SELECT filename, data FROM progress"
+SELECT_CONTINUE_WATCHING = """
+SELECT filename, data FROM progress
+WHERE percentage > 5 AND percentage < 90
+ORDER BY updated_at DESC LIMIT ?
+"""
+SELECT_WATCHED = """
+SELECT filename, data FROM progress
+WHERE percentage > 90
+ORDER BY updated_at DESC LIMIT ?
+"""
+UPSERT_MOVIE = """
+INSERT INTO movies (filename, name, size, mtime, added_at)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (filename) DO UPDATE SET
+    name = excluded.name,
+    size = excluded.size,
+    mtime = excluded.mtime
+"""
+DELETE_MOVIE = "DELETE FROM movies WHERE filename = ?"
+SELECT_MOVIE_NAMES = "SELECT filename FROM movies"
+SELECT_RECENTLY_ADDED = """
+SELECT filename, name, size, mtime, added_at FROM movies
+ORDER BY added_at DESC LIMIT ?
+"""
+
+
+def _number(value):
+    """Coerce a progress field to float for the indexed columns"""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class SQLiteStore(Mapping):
+    """Progress store and movie catalog backed by SQLite
+
+    Behaves like ProgressJournal (a mapping plus record()), so it can sit
+    behind ProgressFlusher. Progress is cached in memory for the per-movie
+    lookups on the home page; the indexed queries go to the database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        self._cache = {filename: json.loads(data)
+                       for filename, data in self._conn.execute(SELECT_ALL_PROGRESS)}
+
+    def __getitem__(self, filename):
+        return self._cache[filename]
+
+    def __iter__(self):
+        return iter(self._cache)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def record(self, filename, progress):
+        """Upsert the progress for one title"""
+        self.record_many([(filename, progress)])
+
+    def record_many(self, items):
+        """Upsert many (filename, progress) pairs in one transaction"""
+        now = time.time()
+        rows = []
+        items = list(items)
+        for filename, progress in items:
+            # app.py stores an epoch timestamp; anything else sorts as "now"
+            last_watched = progress.get('last_watched')
+            updated_at = last_watched if isinstance(last_watched, (int, float)) else now
+            rows.append((
+                filename,
+                _number(progress.get('current_time')),
+                _number(progress.get('duration')),
+                _number(progress.get('percentage')),
+                updated_at,
+                json.dumps(progress, separators=(',', ':')),
+            ))
+        if not rows:
+            return
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(UPSERT_PROGRESS, rows)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                logger.error(f"Error saving progress to {self.path}: {e}")
+                raise
+            # Only what reached the database is visible to readers
+            for filename, progress in items:
+                self._cache[filename] = progress
+
+    def _query_progress(self, sql, limit):
+        with self._lock:
+            rows = self._conn.execute(sql, (limit,)).fetchall()
+        return [(filename, json.loads(data)) for filename, data in rows]
+
+    def continue_watching(self, limit=20):
+        """Partly watched titles, most recently watched first"""
+        return self._query_progress(SELECT_CONTINUE_WATCHING, limit)
+
+    def watched(self, limit=100):
+        """Finished titles, most recently watched first"""
+        return self._query_progress(SELECT_WATCHED, limit)
+
+    def recently_added(self, limit=20):
+        """Movies that appeared in the library most recently, newest first"""
+        with self._lock:
+            rows = self._conn.execute(SELECT_RECENTLY_ADDED, (limit,)).fetchall()
+        return [dict(zip(('filename', 'name', 'size', 'mtime', 'added_at'), row)) for row in rows]
+
+    def update_catalog(self, added=(), removed=(), present=None):
+        """Apply library index changes to the movies table in one transaction
+
+        Matches LibraryIndex.subscribe(); when `present` is given, rows for
+        files no longer in the library are dropped as well.
+        """
+        now = time.time()
+        rows = [(e.filename, e.name, e.size, e.mtime, now) for e in added]
+        removed = list(removed)
+        with self._lock:
+            if present is not None:
+                removed.extend(filename for (filename,) in self._conn.execute(SELECT_MOVIE_NAMES)
+                               if filename not in present)
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(UPSERT_MOVIE, rows)
+                self._conn.executemany(DELETE_MOVIE, [(filename,) for filename in removed])
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"Error updating catalog in {self.path}: {e}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    json_path = sys.argv[2] if len(sys.argv) > 2 else 'watch_progress.json'
+    db_path = sys.argv[3] if len(sys.argv) > 3 else 'cinestream.db'
+    store = SQLiteStore(db_path)
+    count = migrate_json_progress(json_path, store)
+    store.close()
+    print(f"Migrated {count} titles into {db_path}")
@@ -0,0 +1,345 @@
+// Global variables
+const video = document.getElementById('movieVideo');
+let isControlsVisible = true;
+let controlsTimeout;
+let isCinematicMode = false;
+let progressSaveInterval;
+
+// Initialize player
+document.addEventListener('DOMContentLoaded', function() {
+    initializePlayer();
+    showDolbyAnimation();
+
+    // Show resume overlay if there's progress
+    if (resumeTime > 30) {
+        document.getElementById('resumeOverlay').classList.add('active');
+    }
+});
+
+function initializePlayer() {
+    // Video event listeners
+    video.addEventListener('loadedmetadata', updateTotalTime);
+    video.addEventListener('timeupdate', updateProgress);
+    video.addEventListener('ended', handleMovieEnd);
+    video.addEventListener('play', handlePlay);
+    video.addEventListener('pause', handlePause);
+    video.addEventListener('progress', updateBuffer);
+
+    // Touch and gesture handlers
+    setupTouchControls();
+    setupKeyboardControls();
+
+    // Auto-hide controls
+    setupControlsAutoHide();
+
+    // Start progress tracking
+    startProgressTracking();
+}
+
+function showDolbyAnimation() {
+    const dolbyOverlay = document.getElementById('dolbyOverlay');
+    dolbyOverlay.classList.add('active');
+
+    setTimeout(() => {
+        dolbyOverlay.classList.remove('active');
+    }, 3000);
+}
+
+function resumeMovie() {
+    video.currentTime = resumeTime;
+    document.getElementById('resumeOverlay').classList.remove('active');
+    video.play();
+}
+
+function startFromBeginning() {
+    video.currentTime = 0;
+    document.getElementById('resumeOverlay').classList.remove('active');
+    video.play();
+}
+
+function togglePlayPause() {
+    if (video.paused) {
+        video.play();
+    } else {
+        video.pause();
+    }
+}
+
+function handlePlay() {
+    document.getElementById('playIcon').className = 'fas fa-pause';
+    enableCinematicMode();
+}
+
+function handlePause() {
+    document.getElementById('playIcon').className = 'fas fa-play';
+}
+
+function skipTime(seconds) {
+    video.currentTime += seconds;
+    showGestureIndicator(seconds > 0 ? 'right' : 'left');
+}
+
+function showGestureIndicator(direction) {
+    const indicator = document.querySelector('.gesture-indicator.' + direction);
+    indicator.classList.add('show');
+    setTimeout(() => indicator.classList.remove('show'), 1000);
+}
+
+function seekVideo(event) {
+    const progressBar = event.currentTarget;
+    const clickX = event.offsetX;
+    const width = progressBar.offsetWidth;
+    const duration = video.duration;
+
+    video.currentTime = (clickX / width) * duration;
+}
+
+function updateProgress() {
+    const currentTime = video.currentTime;
+    const duration = video.duration;
+    const percentage = (currentTime / duration) * 100;
+
+    document.querySelector('.progress-fill').style.width = percentage + '%';
+    document.getElementById('currentTime').textContent = formatTime(currentTime);
+}
+
+function updateBuffer() {
+    if (video.buffered.length > 0) {
+        const bufferedEnd = video.buffered.end(video.buffered.length - 1);
+        const duration = video.duration;
+        const bufferedPercentage = (bufferedEnd / duration) * 100;
+
+        document.querySelector('.progress-buffer').style.width = bufferedPercentage + '%';
+    }
+}
+
+function updateTotalTime() {
+    document.getElementById('totalTime').textContent = formatTime(video.duration);
+}
+
+function formatTime(seconds) {
+    const minutes = Math.floor(seconds / 60);
+    const secs = Math.floor(seconds % 60);
+    return minutes + ':' + (secs < 10 ? '0' : '') + secs;
+}
+
+function toggleMute() {
+    video.muted = !video.muted;
+    const icon = document.getElementById('volumeIcon');
+    icon.className = video.muted ? 'fas fa-volume-mute' : 'fas fa-volume-up';
+}
+
+function toggleFullscreen() {
+    if (!document.fullscreenElement) {
+        document.documentElement.requestFullscreen();
+        document.getElementById('fullscreenIcon').className = 'fas fa-compress';
+    } else {
+        document.exitFullscreen();
+        document.getElementById('fullscreenIcon').className = 'fas fa-expand';
+    }
+}
+
+function toggleCinematicMode() {
+    isCinematicMode = !isCinematicMode;
+    const bars = document.querySelectorAll('.cinematic-bars');
+    const vignette = document.querySelector('.theater-vignette');
+
+    bars.forEach(bar => bar.classList.toggle('active', isCinematicMode));
+    vignette.classList.toggle('active', isCinematicMode);
+}
+
+function enableCinematicMode() {
+    if (!isCinematicMode) {
+        toggleCinematicMode();
+    }
+}
+
+function setupTouchControls() {
+    let touchStartX = 0;
+    let touchStartY = 0;
+
+    video.addEventListener('touchstart', function(e) {
+        touchStartX = e.touches[0].clientX;
+        touchStartY = e.touches[0].clientY;
+        showControls();
+    });
+
+    video.addEventListener('touchmove', function(e) {
+        e.preventDefault();
+    });
+
+    video.addEventListener('touchend', function(e) {
+        const touchEndX = e.changedTouches[0].clientX;
+        const touchEndY = e.changedTouches[0].clientY;
+        const deltaX = touchEndX - touchStartX;
+        const deltaY = touchEndY - touchStartY;
+
+        // Swipe gestures
+        if (Math.abs(deltaX) > Math.abs(deltaY) && Math.abs(deltaX) > 50) {
+            if (deltaX > 0) {
+                skipTime(10); // Swipe right - forward
+            } else {
+                skipTime(-10); // Swipe left - backward
+            }
+        } else if (Math.abs(deltaY) > 50) {
+            if (deltaY < 0) {
+                // Swipe up - show controls
+                showControls();
+            } else {
+                // Swipe down - hide controls
+                hideControls();
+            }
+        } else {
+            // Tap - toggle play/pause
+            togglePlayPause();
+        }
+    });
+}
+
+function setupKeyboardControls() {
+    document.addEventListener('keydown', function(e) {
+        switch(e.key) {
+            case ' ':
+                e.preventDefault();
+                togglePlayPause();
+                break;
+            case 'ArrowLeft':
+                skipTime(-10);
+                break;
+            case 'ArrowRight':
+                skipTime(10);
+                break;
+            case 'ArrowUp':
+                video.volume = Math.min(1, video.volume + 0.1);
+                break;
+            case 'ArrowDown':
+                video.volume = Math.max(0, video.volume - 0.1);
+                break;
+            case 'f':
+            case 'F':
+                toggleFullscreen();
+                break;
+            case 'm':
+            case 'M':
+                toggleMute();
+                break;
+            case 'c':
+            case 'C':
+                toggleCinematicMode();
+                break;
+        }
+        showControls();
+    });
+}
+
+function setupControlsAutoHide() {
+    const playerContainer = document.querySelector('.player-container');
+
+    playerContainer.addEventListener('mousemove', showControls);
+    playerContainer.addEventListener('touchstart', showControls);
+
+    showControls(); // Show initially
+}
+
+function showControls() {
+    isControlsVisible = true;
+    document.querySelector('.top-controls').classList.remove('hidden');
+    document.querySelector('.mobile-controls').classList.remove('hidden');
+
+    // Auto-hide after 3 seconds
+    clearTimeout(controlsTimeout);
+    controlsTimeout = setTimeout(hideControls, 3000);
+}
+
+function hideControls() {
+    if (!video.paused) {
+        isControlsVisible = false;
+        document.querySelector('.top-controls').classList.add('hidden');
+        document.querySelector('.mobile-controls').classList.add('hidden');
+    }
+}
+
+function startProgressTracking() {
+    progressSaveInterval = setInterval(saveProgress, 10000); // Save every 10 seconds
+}
+
+function saveProgress() {
+    if (!video.paused && video.currentTime > 0) {
+        const currentTime = Math.floor(video.currentTime);
+        const duration = Math.floor(video.duration);
+        const percentage = Math.floor((currentTime / duration) * 100);
+
+        fetch('/save-progress', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                filename: filename,
+                current_time: currentTime,
+                duration: duration,
+                percentage: percentage
+            })
+        });
+    }
+}
+
+function handleMovieEnd() {
+    // Mark as completed
+    saveProgress();
+
+    // Show ending overlay
+    setTimeout(() => {
+        document.getElementById('endingOverlay').classList.add('active');
+        showDolbyAnimation();
+    }, 1000);
+
+    // Auto-return to library after 8 seconds
+    setTimeout(() => {
+        goBack();
+    }, 8000);
+}
+
+function watchAgain() {
+    video.currentTime = 0;
+    document.getElementById('endingOverlay').classList.remove('active');
+    video.play();
+}
+
+function goBack() {
+    clearInterval(progressSaveInterval);
+    window.location.href = '/';
+}
+
+function toggleQualityDropdown() {
+    const dropdown = document.querySelector('.quality-dropdown');
+    dropdown.classList.toggle('active');
+}
+
+// Quality selector handlers
+document.querySelectorAll('.quality-option').forEach(option => {
+    option.addEventListener('click', function() {
+        const quality = this.dataset.quality;
+        const qualityBtn = document.querySelector('.quality-btn');
+
+        // Update button text
+        qualityBtn.textContent = quality.toUpperCase();
+
+        // Update active state
+        document.querySelectorAll('.quality-option').forEach(opt => opt.classList.remove('active'));
+        this.classList.add('active');
+
+        // Hide dropdown
+        document.querySelector('.quality-dropdown').classList.remove('active');
+
+        // Here you would implement actual quality switching
+        console.log('Quality changed to:', quality);
+    });
+});
+
+// Close dropdown when clicking outside
+document.addEventListener('click', function(e) {
+    if (!e.target.closest('.quality-selector')) {
+        document.querySelector('.quality-dropdown').classList.remove('active');
+    }
+});
@@ -0,0 +1,197 @@
+const video = document.getElementById('movieVideo');
+const dolbyIntro = document.getElementById('dolbyIntro');
+const playerControls = document.getElementById('playerControls');
+let controlsTimeout;
+let isVolumeBeforeMute = 1;
+
+// Show Dolby intro
+setTimeout(() => {
+    dolbyIntro.classList.add('active');
+    setTimeout(() => {
+        dolbyIntro.classList.remove('active');
+    }, 4000);
+}, 500);
+
+// Auto-hide controls
+function showControls() {
+    playerControls.classList.remove('hidden');
+    clearTimeout(controlsTimeout);
+    controlsTimeout = setTimeout(() => {
+        if (!video.paused) {
+            playerControls.classList.add('hidden');
+        }
+    }, 3000);
+}
+
+// Event listeners
+video.addEventListener('loadedmetadata', () => {
+    document.getElementById('totalTime').textContent = formatTime(video.duration);
+});
+
+video.addEventListener('timeupdate', () => {
+    const currentTime = video.currentTime;
+    const duration = video.duration;
+
+    if (duration > 0) {
+        const percentage = (currentTime / duration) * 100;
+        document.getElementById('progressBar').style.width = percentage + '%';
+    }
+
+    document.getElementById('currentTime').textContent = formatTime(currentTime);
+
+    // Save progress every 10 seconds
+    if (Math.floor(currentTime) % 10 === 0) {
+        saveProgress(currentTime, duration);
+    }
+});
+
+video.addEventListener('progress', () => {
+    if (video.buffered.length > 0) {
+        const bufferedEnd = video.buffered.end(video.buffered.length - 1);
+        const duration = video.duration;
+
+        if (duration > 0) {
+            const bufferedPercentage = (bufferedEnd / duration) * 100;
+            document.getElementById('bufferBar').style.width = bufferedPercentage + '%';
+        }
+    }
+});
+
+video.addEventListener('play', () => {
+    document.getElementById('playIcon').className = 'fas fa-pause';
+    showControls();
+});
+
+video.addEventListener('pause', () => {
+    document.getElementById('playIcon').className = 'fas fa-play';
+    playerControls.classList.remove('hidden');
+});
+
+// Touch and mouse events
+document.addEventListener('mousemove', showControls);
+document.addEventListener('touchstart', showControls);
+
+// Resume video functionality
+function resumeVideo() {
+    video.currentTime = resumeTime;
+    document.getElementById('resumeNotification').classList.remove('active');
+    video.play();
+}
+
+function startFromBeginning() {
+    video.currentTime = 0;
+    document.getElementById('resumeNotification').classList.remove('active');
+    video.play();
+}
+
+// Player controls
+function togglePlayPause() {
+    if (video.paused) {
+        video.play();
+    } else {
+        video.pause();
+    }
+}
+
+function seekVideo(event) {
+    const progressBar = event.currentTarget;
+    const rect = progressBar.getBoundingClientRect();
+    const clickX = event.clientX - rect.left;
+    const width = rect.width;
+    const duration = video.duration;
+
+    video.currentTime = (clickX / width) * duration;
+}
+
+function toggleMute() {
+    if (video.muted) {
+        video.muted = false;
+        video.volume = isVolumeBeforeMute;
+    } else {
+        isVolumeBeforeMute = video.volume;
+        video.muted = true;
+    }
+    updateVolumeDisplay();
+}
+
+function setVolume(event) {
+    const volumeSlider = event.currentTarget;
+    const rect = volumeSlider.getBoundingClientRect();
+    const clickX = event.clientX - rect.left;
+    const width = rect.width;
+
+    const newVolume = Math.max(0, Math.min(1, clickX / width));
+    video.volume = newVolume;
+    video.muted = false;
+    updateVolumeDisplay();
+}
+
+function updateVolumeDisplay() {
+    const volumeFill = document.getElementById('volumeFill');
+    const volumeIcon = document.getElementById('volumeIcon');
+
+    if (video.muted || video.volume === 0) {
+        volumeFill.style.width = '0%';
+        volumeIcon.className = 'fas fa-volume-mute';
+    } else {
+        volumeFill.style.width = (video.volume * 100) + '%';
+        if (video.volume < 0.5) {
+            volumeIcon.className = 'fas fa-volume-down';
+        } else {
+            volumeIcon.className = 'fas fa-volume-up';
+        }
+    }
+}
+
+function toggleFullscreen() {
+    if (!document.fullscreenElement) {
+        document.documentElement.requestFullscreen();
+    } else {
+        document.exitFullscreen();
+    }
+}
+
+// Update fullscreen icon
+document.addEventListener('fullscreenchange', () => {
+    const fullscreenIcon = document.getElementById('fullscreenIcon');
+    fullscreenIcon.className = document.fullscreenElement ? 'fas fa-compress' : 'fas fa-expand';
+});
+
+// Format time display
+function formatTime(seconds) {
+    if (isNaN(seconds)) return '0:00';
+
+    const hours = Math.floor(seconds / 3600);
+    const minutes = Math.floor((seconds % 3600) / 60);
+    const secs = Math.floor(seconds % 60);
+
+    if (hours > 0) {
+        return `${hours}:${minutes.toString().padStart(2, '0')}:${secs.toString().padStart(2, '0')}`;
+    } else {
+        return `${minutes}:${secs.toString().padStart(2, '0')}`;
+    }
+}
+
+// Save progress to server
+function saveProgress(currentTime, duration) {
+    fetch('/save-progress', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            filename: filename,
+            current_time: currentTime,
+            duration: duration
+        })
+    }).catch(console.error);
+}
+
+// Initialize volume display
+video.addEventListener('volumechange', updateVolumeDisplay);
+updateVolumeDisplay();
+
+// Initialize cinema controls
+if (typeof CinemaControls !== 'undefined') {
+    const cinemaControls = new CinemaControls(video);
+}
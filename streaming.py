@@ -0,0 +1,1486 @@
+"""
+CineStream streaming engine
+Shared byte-range delivery for the web server and the Android app
+"""
+
+import io
+import os
+import re
+import mmap
+import time
+import select
+import socket
+import threading
+import logging
+from collections import OrderedDict
+from urllib.parse import quote
+
+from werkzeug.http import http_date, parse_date, parse_etags, parse_if_range_header, quote_etag
+
+logger = logging.getLogger(__name__)
+
+# Block size passed to the server's wsgi.file_wrapper
+STREAM_BLOCK_SIZE = int(os.environ.get("STREAM_BLOCK_SIZE", 1024 * 1024))
+
+# Set STREAM_ZERO_COPY=0 to force the buffered fallback path
+ZERO_COPY_ENABLED = os.environ.get("STREAM_ZERO_COPY", "1") != "0"
+
+# Freshness lifetime for media responses; files are revalidated with their
+# ETag/Last-Modified afterwards, so a replaced file is picked up
+MEDIA_MAX_AGE = int(os.environ.get("STREAM_MAX_AGE", 86400))
+MEDIA_CACHE_CONTROL = f"public, max-age={MEDIA_MAX_AGE}"
+
+# Open-file cache for buffered reads: most handles kept open, and seconds an
+# unused handle stays open. STREAM_FD_CACHE_SIZE=0 opens per request.
+FD_CACHE_SIZE = int(os.environ.get("STREAM_FD_CACHE_SIZE", 64))
+FD_IDLE_TIMEOUT = float(os.environ.get("STREAM_FD_IDLE_TIMEOUT", 30))
+
+# Set STREAM_MMAP=1 to serve buffered ranges from shared memory maps of
+# the movie files (for hosts that cannot sendfile, e.g. TLS termination)
+MMAP_ENABLED = os.environ.get("STREAM_MMAP", "0") == "1"
+
+# Shared chunk cache for files read by several clients: byte budget
+# (0 disables) and segment size, e.g. 64m and 1m
+CHUNK_CACHE_SPEC = os.environ.get("STREAM_CACHE_SIZE", "64m")
+CHUNK_CACHE_SEGMENT_SPEC = os.environ.get("STREAM_CACHE_SEGMENT", "1m")
+
+# Read-size policy, e.g. "initial=64k,min=64k,max=4m,startup=1m,target=0.25"
+# or "fixed=1m" to disable adaptation
+CHUNK_POLICY_SPEC = os.environ.get("STREAM_CHUNK_POLICY", "")
+
+# Page-cache hints for sequential playback: how far ahead of each stream
+# to ask the kernel to read, and how far behind it to keep pages before
+# dropping them. Sizes like 8m; 0 disables either.
+READAHEAD_SPEC = os.environ.get("STREAM_READAHEAD", "8m")
+DROP_BEHIND_SPEC = os.environ.get("STREAM_DROP_BEHIND", "32m")
+
+# Bandwidth pacing. STREAM_BANDWIDTH is the capacity (bytes per second,
+# e.g. 80m) shared fairly between active responses; STREAM_PACE caps each
+# /stream at that multiple of the title's bitrate after a burst of
+# STREAM_BURST_SECONDS of video. Both 0 (the default) disable pacing.
+BANDWIDTH_SPEC = os.environ.get("STREAM_BANDWIDTH", "0")
+PACE_MULTIPLE = float(os.environ.get("STREAM_PACE", 0))
+BURST_SECONDS = float(os.environ.get("STREAM_BURST_SECONDS", 10))
+
+# Bitrate assumed for titles whose duration is not known yet (bytes per
+# second), and the share of a bulk download relative to a stream
+DEFAULT_RATE_SPEC = os.environ.get("STREAM_DEFAULT_RATE", "1m")
+DOWNLOAD_WEIGHT = float(os.environ.get("STREAM_DOWNLOAD_WEIGHT", 0.25))
+
+# Seconds between checks of whether a streaming client has hung up
+DISCONNECT_CHECK_INTERVAL = float(os.environ.get("STREAM_DISCONNECT_CHECK", 0.5))
+
+# Admission control: most media responses served at once, and per client
+# address (0 = unlimited); how many requests may wait for a slot and for
+# how many seconds; and the Retry-After sent with the 503 when full
+MAX_ACTIVE_STREAMS = int(os.environ.get("STREAM_MAX_ACTIVE", 0))
+MAX_CLIENT_STREAMS = int(os.environ.get("STREAM_MAX_PER_CLIENT", 0))
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 16))
+STREAM_QUEUE_TIMEOUT = float(os.environ.get("STREAM_QUEUE_TIMEOUT", 5))
+STREAM_RETRY_AFTER = int(os.environ.get("STREAM_RETRY_AFTER", 10))
+
+
+def parse_size(value):
+    """Parse a byte size such as 8192, 64k or 4m"""
+    value = value.strip().lower()
+    multipliers = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    if value and value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+class ChunkPolicy:
+    """Read-size policy for buffered range delivery
+
+    The first `startup` bytes of every range go out in small `initial`
+    chunks so playback can start quickly after a seek. After that each
+    chunk is sized to what the client drained in roughly `target` seconds,
+    at most doubling per step and clamped to [min, max].
+    """
+
+    def __init__(self, initial=64 * 1024, minimum=64 * 1024, maximum=4 * 1024 * 1024,
+                 startup=1024 * 1024, target=0.25):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.startup = startup
+        self.target = target
+
+    @classmethod
+    def fixed(cls, size):
+        """Policy that always reads `size` bytes"""
+        return cls(initial=size, minimum=size, maximum=size, startup=0)
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Build a policy from a STREAM_CHUNK_POLICY string"""
+        if not spec:
+            return cls()
+        options = {}
+        for item in spec.split(','):
+            if '=' not in item:
+                continue
+            key, value = item.split('=', 1)
+            options[key.strip().lower()] = value.strip()
+        try:
+            if 'fixed' in options:
+                return cls.fixed(parse_size(options['fixed']))
+            defaults = cls()
+            return cls(
+                initial=parse_size(options.get('initial', str(defaults.initial))),
+                minimum=parse_size(options.get('min', str(defaults.minimum))),
+                maximum=parse_size(options.get('max', str(defaults.maximum))),
+                startup=parse_size(options.get('startup', str(defaults.startup))),
+                target=float(options.get('target', defaults.target)),
+            )
+        except ValueError:
+            logger.warning(f"Invalid STREAM_CHUNK_POLICY {spec!r}, using defaults")
+            return cls()
+
+    def first_size(self, length):
+        """Size of the first read for a range of `length` bytes"""
+        size = self.initial if self.startup else self.maximum
+        return max(1, min(size, length))
+
+    def next_size(self, current, sent, seconds, remaining):
+        """Size of the next read given how fast the last chunk drained"""
+        if sent < self.startup:
+            size = self.initial
+        elif seconds <= 0:
+            size = current * 2
+        else:
+            rate = current / seconds
+            size = min(int(rate * self.target), current * 2)
+        size = max(self.minimum, min(self.maximum, size))
+        return max(1, min(size, remaining))
+
+
+default_chunk_policy = ChunkPolicy.from_spec(CHUNK_POLICY_SPEC)
+
+
+def _size_setting(name, spec):
+    try:
+        return parse_size(spec) if spec else 0
+    except ValueError:
+        logger.warning(f"Invalid {name} {spec!r}, disabled")
+        return 0
+
+
+READAHEAD_BYTES = _size_setting('STREAM_READAHEAD', READAHEAD_SPEC)
+DROP_BEHIND_BYTES = _size_setting('STREAM_DROP_BEHIND', DROP_BEHIND_SPEC)
+CHUNK_CACHE_BYTES = _size_setting('STREAM_CACHE_SIZE', CHUNK_CACHE_SPEC)
+CHUNK_CACHE_SEGMENT = _size_setting('STREAM_CACHE_SEGMENT', CHUNK_CACHE_SEGMENT_SPEC) or 1024 * 1024
+BANDWIDTH_BYTES = _size_setting('STREAM_BANDWIDTH', BANDWIDTH_SPEC)
+DEFAULT_RATE = _size_setting('STREAM_DEFAULT_RATE', DEFAULT_RATE_SPEC) or 1024 * 1024
+
+
+def _fadvise(fd, offset, length, advice):
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError as e:
+        # Some network and FUSE filesystems reject hints; they are optional
+        logger.debug(f"posix_fadvise failed: {e}")
+
+
+class ReadAhead:
+    """Page-cache hints for one sequential read through a file
+
+    Marks the file SEQUENTIAL, keeps a WILLNEED window of `window` bytes
+    ahead of the read position, up to `limit`, and drops pages more than
+    `drop_behind` bytes behind it with DONTNEED, so a single long film
+    does not push everything else out of the page cache. A no-op where
+    posix_fadvise is unavailable.
+
+    `shared` is the FileHandleCache entry the fd belongs to; drop-behind
+    is held back while other streams hold it too, since they may still
+    be reading the pages behind this one.
+    """
+
+    def __init__(self, fd, start, limit, window=None, drop_behind=None, shared=None):
+        self.fd = fd
+        self.shared = shared
+        self.limit = limit
+        self.window = READAHEAD_BYTES if window is None else window
+        self.drop_behind = DROP_BEHIND_BYTES if drop_behind is None else drop_behind
+        self.enabled = hasattr(os, 'posix_fadvise') and bool(self.window or self.drop_behind)
+        self.advised = start
+        self.dropped = start
+        if self.enabled:
+            _fadvise(fd, start, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    def advance(self, offset):
+        """Update the hints for a stream about to read at `offset`"""
+        if not self.enabled:
+            return
+        # Top the window up once half of it has been consumed
+        if self.window and offset + self.window // 2 >= self.advised:
+            until = min(self.limit, offset + self.window)
+            if until > self.advised:
+                start = max(offset, self.advised)
+                _fadvise(self.fd, start, until - start, os.POSIX_FADV_WILLNEED)
+                self.advised = until
+        # Drop in steps of drop_behind so each call covers a large span
+        if self.drop_behind and offset - self.dropped >= 2 * self.drop_behind:
+            if self.shared is not None and self.shared.refs > 1:
+                return
+            until = offset - self.drop_behind
+            _fadvise(self.fd, self.dropped, until - self.dropped, os.POSIX_FADV_DONTNEED)
+            self.dropped = until
+
+# More ranges than this in one request (after coalescing) are answered
+# with the whole file, as Apache does, rather than a huge multipart body
+MAX_RANGES = 16
+
+# Ranges closer than this are merged; a multipart part header costs about
+# as much as re-sending the gap
+RANGE_COALESCE_GAP = 80
+
+_RANGE_SPEC = re.compile(r'^(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(ValueError):
+    """No range in a Range header overlaps the file (HTTP 416)"""
+
+
+def parse_range(header, file_size):
+    """Parse an RFC 7233 Range header into sorted, coalesced (start, end) pairs
+
+    Ends are inclusive and clamped to the file. Returns None when the
+    header should be ignored and the whole file sent: a unit other than
+    bytes, a malformed range set, or more than MAX_RANGES ranges. Raises
+    RangeNotSatisfiable when the header is valid but no range overlaps
+    the file.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+    ranges = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            # Empty list elements are allowed by the ABNF
+            continue
+        match = _RANGE_SPEC.match(item)
+        if match is None:
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = int(last) if last else file_size - 1
+            if last and end < start:
+                return None
+        elif last:
+            # Suffix range: the final N bytes
+            suffix = int(last)
+            if suffix == 0:
+                continue
+            start = max(0, file_size - suffix)
+            end = file_size - 1
+        else:
+            return None
+        if start >= file_size:
+            continue
+        ranges.append((start, min(end, file_size - 1)))
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1 + RANGE_COALESCE_GAP:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def file_identity(st):
+    """What must stay equal for an open handle to still show the same file"""
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class CachedFile:
+    """A read-only descriptor shared by every request reading one file
+
+    `mapping` is a read-only mmap of the whole file, created on first use
+    by FileHandleCache.mapping() and unmapped together with the handle.
+    """
+
+    __slots__ = ('path', 'fd', 'identity', 'refs', 'last_used', 'detached', 'mapping')
+
+    def __init__(self, path, fd, identity):
+        self.path = path
+        self.fd = fd
+        self.identity = identity
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self.detached = False
+        self.mapping = None
+
+    def close(self):
+        """Unmap and close the descriptor"""
+        if self.mapping is not None:
+            try:
+                self.mapping.close()
+            except BufferError:
+                # A slice is still referenced somewhere; the map is
+                # released when that memoryview is collected
+                logger.debug(f"Memory map of {self.path} still in use")
+            self.mapping = None
+        os.close(self.fd)
+
+
+class FileHandleCache:
+    """LRU cache of open file descriptors, read with os.pread
+
+    Players fire many small range requests while seeking; on SMB/NFS
+    mounts every open() is a server round-trip. Descriptors are shared
+    by all requests for a file (pread has no shared offset) and counted,
+    so one is only closed when no request is using it. Handles are
+    dropped when the file's identity (device, inode, size, mtime) no
+    longer matches the stat of the current request, when the cache is
+    over `capacity`, and after `idle_timeout` seconds unused.
+    """
+
+    def __init__(self, capacity=None, idle_timeout=None):
+        self.capacity = FD_CACHE_SIZE if capacity is None else capacity
+        self.idle_timeout = FD_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.hits = 0
+        self.misses = 0
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def __len__(self):
+        return len(self._files)
+
+    def acquire(self, path, st=None):
+        """Shared handle for `path`; pair every call with release()
+
+        `st` is the stat the response headers were built from; a cached
+        handle for a different version of the file is not reused.
+        """
+        identity = file_identity(st) if st is not None else None
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None and identity is not None and entry.identity != identity:
+                self._detach(entry)
+                entry = None
+            if entry is not None:
+                self._files.move_to_end(path)
+                entry.refs += 1
+                self.hits += 1
+                return entry
+
+        # Open outside the lock so a slow network open does not stall
+        # requests for other files
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+        try:
+            entry = CachedFile(path, fd, file_identity(os.fstat(fd)))
+        except OSError:
+            os.close(fd)
+            raise
+        with self._lock:
+            self.misses += 1
+            existing = self._files.get(path)
+            if existing is not None and existing.identity == entry.identity:
+                # Another request opened it meanwhile
+                os.close(fd)
+                existing.refs += 1
+                return existing
+            if existing is not None:
+                self._detach(existing)
+            entry.refs = 1
+            self._files[path] = entry
+            self._evict()
+            if self._sweeper is None and self.idle_timeout > 0:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name='fd-cache-sweeper', daemon=True)
+                self._sweeper.start()
+        return entry
+
+    def release(self, entry):
+        """Give back a handle from acquire()"""
+        with self._lock:
+            entry.refs -= 1
+            entry.last_used = time.monotonic()
+            if entry.refs == 0:
+                if entry.detached:
+                    entry.close()
+                else:
+                    self._evict()
+
+    def mapping(self, entry):
+        """Read-only mmap of an acquired handle's file, shared and cached
+
+        Returns None for empty files, which cannot be mapped.
+        """
+        if entry.mapping is None and entry.identity[2] > 0:
+            with self._lock:
+                if entry.mapping is None:
+                    entry.mapping = mmap.mmap(entry.fd, 0, access=mmap.ACCESS_READ)
+        return entry.mapping
+
+    def invalidate(self, path):
+        """Drop the handle for `path`; readers still using it finish first"""
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None:
+                self._detach(entry)
+
+    def sweep(self):
+        """Close handles unused for longer than idle_timeout"""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            for entry in list(self._files.values()):
+                if entry.refs == 0 and entry.last_used < cutoff:
+                    self._detach(entry)
+
+    def clear(self):
+        """Drop every handle"""
+        with self._lock:
+            for entry in list(self._files.values()):
+                self._detach(entry)
+
+    def _detach(self, entry):
+        """Remove an entry from the cache, closing it once unused (lock held)"""
+        if self._files.get(entry.path) is entry:
+            del self._files[entry.path]
+        entry.detached = True
+        if entry.refs == 0:
+            entry.close()
+
+    def _evict(self):
+        """Close least recently used idle handles while over capacity (lock held)"""
+        if len(self._files) <= self.capacity:
+            return
+        for entry in list(self._files.values()):
+            if entry.refs == 0:
+                self._detach(entry)
+                if len(self._files) <= self.capacity:
+                    return
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.idle_timeout)
+            try:
+                self.sweep()
+            except OSError as e:
+                logger.error(f"Error closing idle file handles: {e}")
+
+
+# os.pread is POSIX only; elsewhere every request opens its own file
+file_handles = FileHandleCache() if hasattr(os, 'pread') and FD_CACHE_SIZE > 0 else None
+
+
+class ChunkCache:
+    """Byte-budgeted LRU cache of file segments shared by all streams
+
+    Files are cut into `segment_size`-aligned segments keyed by file
+    identity (device, inode, size, mtime) and segment number, so several
+    devices watching the same film, or one viewer seeking back, read each
+    segment from disk once. A replaced file has a new identity, and its
+    old segments simply age out.
+
+    The cache never changes how much a stream reads: a block may span
+    several segments, and bytes not in memory are read from disk exactly
+    as asked, so a small read after a seek does not pull in a whole
+    segment. Segments that a read covers completely are kept.
+    """
+
+    def __init__(self, max_bytes=None, segment_size=None):
+        self.max_bytes = CHUNK_CACHE_BYTES if max_bytes is None else max_bytes
+        self.segment_size = segment_size or CHUNK_CACHE_SEGMENT
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._segments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._segments)
+
+    @property
+    def hit_rate(self):
+        """Share of segment lookups served from memory"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """Counters for monitoring"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hit_rate, 4),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'segments': len(self._segments),
+        }
+
+    def read(self, identity, fd, offset, size):
+        """Up to `size` bytes at `offset`, from memory where cached"""
+        end = min(offset + size, identity[2])
+        parts = []
+        while offset < end:
+            index, position = divmod(offset, self.segment_size)
+            data = self._lookup(identity, index)
+            if data is not None:
+                if position or end - offset < len(data):
+                    data = data[position:position + end - offset]
+                if not data:
+                    break
+            else:
+                # One read up to the next cached segment (or the end)
+                until = self._next_cached(identity, index + 1, end)
+                data = os.pread(fd, until - offset, offset)
+                if not data:
+                    break
+                self._keep(identity, offset, data)
+            parts.append(data)
+            offset += len(data)
+        if len(parts) == 1:
+            return parts[0]
+        return b''.join(parts)
+
+    def _lookup(self, identity, index):
+        key = (identity, index)
+        with self._lock:
+            data = self._segments.get(key)
+            if data is not None:
+                self._segments.move_to_end(key)
+                self.hits += 1
+            return data
+
+    def _next_cached(self, identity, index, end):
+        """Start of the first cached segment from `index` before `end`, else `end`"""
+        with self._lock:
+            while index * self.segment_size < end:
+                if (identity, index) in self._segments:
+                    return index * self.segment_size
+                index += 1
+        return end
+
+    def _keep(self, identity, offset, data):
+        """Cache the segments that `data`, read at `offset`, covers completely"""
+        segment_size = self.segment_size
+        file_size = identity[2]
+        first = -(-offset // segment_size)
+        last = (offset + len(data) - 1) // segment_size
+        with self._lock:
+            self.misses += last - offset // segment_size + 1
+            for index in range(first, last + 1):
+                start = index * segment_size
+                stop = min(start + segment_size, file_size)
+                if stop > offset + len(data) or (identity, index) in self._segments:
+                    continue
+                if start == offset and stop - start == len(data):
+                    segment = data
+                else:
+                    segment = data[start - offset:stop - offset]
+                if len(segment) > self.max_bytes:
+                    continue
+                self._segments[(identity, index)] = segment
+                self.bytes += len(segment)
+                while self.bytes > self.max_bytes:
+                    _, evicted = self._segments.popitem(last=False)
+                    self.bytes -= len(evicted)
+                    self.evictions += 1
+
+    def clear(self):
+        """Drop every cached segment"""
+        with self._lock:
+            self._segments.clear()
+            self.bytes = 0
+
+
+# Needs os.pread and the handle cache's file identities
+chunk_cache = ChunkCache() if file_handles is not None and CHUNK_CACHE_BYTES > 0 else None
+
+
+class RangeHistory:
+    """Where each client's last range of each file ended
+
+    A range that starts where the same client's previous one ended is
+    the sign of sequential playback in bounded chunks; read-ahead for it
+    continues past the end of the range, where the next request will
+    start. Seeks get read-ahead only within the range they asked for.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self._ends = OrderedDict()
+        self._lock = threading.Lock()
+
+    def follows(self, client, path, start, end):
+        """Record a range; True when it continues the client's previous one"""
+        key = (client, path)
+        with self._lock:
+            previous = self._ends.pop(key, None)
+            self._ends[key] = end
+            if len(self._ends) > self.size:
+                self._ends.popitem(last=False)
+        return previous is not None and previous < start <= previous + 1 + RANGE_COALESCE_GAP
+
+
+range_history = RangeHistory()
+
+
+def client_socket(environ):
+    """The client connection of a WSGI request, where the server exposes it"""
+    return environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+
+
+def peer_closed(sock):
+    """Check without blocking whether the peer closed or reset the connection
+
+    A readable socket whose peek returns no data has seen the client's FIN;
+    a pipelined next request is data, so it does not count as closed.
+    """
+    try:
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+            poller.register(sock, select.POLLIN | select.POLLHUP | select.POLLERR)
+            if not poller.poll(0):
+                return False
+        elif not select.select([sock], [], [], 0)[0]:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except (BlockingIOError, InterruptedError):
+        return False
+    except ValueError:
+        # TLS sockets do not support MSG_PEEK; rely on failed writes there
+        return False
+    except OSError:
+        return True
+
+
+class DisconnectMonitor:
+    """Notices promptly when the client of a streaming response hangs up
+
+    Browsers drop the old range request on every seek. The server only
+    finds out when a write fails, which can be several blocks later; the
+    body checks gone() between blocks (at most every `interval` seconds)
+    and stops reading from disk as soon as the peer has closed.
+    """
+
+    __slots__ = ('sock', 'interval', 'checked', 'closed')
+
+    def __init__(self, sock, interval=None):
+        self.sock = sock
+        self.interval = DISCONNECT_CHECK_INTERVAL if interval is None else interval
+        self.checked = 0.0
+        self.closed = False
+
+    @classmethod
+    def for_environ(cls, environ):
+        """Monitor for a request's client, or None if the server hides the socket"""
+        sock = client_socket(environ)
+        if sock is None or DISCONNECT_CHECK_INTERVAL <= 0:
+            return None
+        return cls(sock)
+
+    def gone(self):
+        if self.closed:
+            return True
+        now = time.monotonic()
+        if now - self.checked >= self.interval:
+            self.checked = now
+            self.closed = peer_closed(self.sock)
+        return self.closed
+
+
+class DeliveryStats:
+    """How media ranges ended: sent in full, aborted by the client, or
+    handed to the server's sendfile, which does not report back"""
+
+    def __init__(self):
+        self.completed = 0
+        self.aborted = 0
+        self.offloaded = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def record(self, completed, sent=0):
+        """Count one range; `completed` None means the server sent it"""
+        with self._lock:
+            if completed is None:
+                self.offloaded += 1
+            elif completed:
+                self.completed += 1
+            else:
+                self.aborted += 1
+            self.bytes_sent += sent
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                'completed': self.completed,
+                'aborted': self.aborted,
+                'offloaded': self.offloaded,
+                'bytes_sent': self.bytes_sent,
+            }
+
+
+delivery_stats = DeliveryStats()
+
+
+class TokenBucket:
+    """Pacing state for one response body
+
+    Starts with `burst` bytes of credit, then earns `rate` bytes per
+    second, holding at most one second's worth once the burst is spent.
+    A rate of 0 means unpaced. The scheduler adjusts `rate` while the
+    response runs; `demand` (the paced rate, or None for as fast as
+    allowed) and `weight` are what it shares capacity by.
+    """
+
+    __slots__ = ('scheduler', 'weight', 'demand', 'rate', 'tokens', 'updated', 'active')
+
+    def __init__(self, scheduler, weight=1.0, demand=None, burst=0):
+        self.scheduler = scheduler
+        self.weight = weight
+        self.demand = demand
+        self.rate = demand or 0
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.active = False
+
+    def start(self):
+        """Join the scheduler's share of the capacity"""
+        if not self.active:
+            self.active = True
+            self.updated = time.monotonic()
+            self.scheduler.add(self)
+
+    def stop(self):
+        """Leave the scheduler, returning this body's share to the others"""
+        if self.active:
+            self.active = False
+            self.scheduler.remove(self)
+
+    def delay(self, nbytes):
+        """Take `nbytes` of credit; seconds to wait before sending them"""
+        rate = self.rate
+        if not rate:
+            return 0
+        now = time.monotonic()
+        earned = (now - self.updated) * rate
+        self.updated = now
+        self.tokens = min(self.tokens + earned, max(self.tokens, rate)) - nbytes
+        return -self.tokens / rate if self.tokens < 0 else 0
+
+    def throttle(self, nbytes, monitor=None):
+        """Block until `nbytes` may be sent; False if the client hung up meanwhile"""
+        wait = self.delay(nbytes)
+        if monitor is None:
+            if wait > 0:
+                time.sleep(wait)
+            return True
+        # Sleep in short steps so a long wait ends when the client leaves
+        deadline = time.monotonic() + wait
+        while wait > 0:
+            time.sleep(min(wait, monitor.interval or wait))
+            if monitor.gone():
+                return False
+            wait = deadline - time.monotonic()
+        return True
+
+
+class BandwidthScheduler:
+    """Weighted fair sharing of the serving bandwidth between responses
+
+    Each /stream is paced at `pace` times its title's bitrate after a
+    burst of `burst_seconds` of video, so the player fills its buffer
+    quickly and then takes only what playback needs. When a `capacity`
+    is set it is divided by weighted max-min fairness: streams asking for
+    less than their share get their paced rate, and what they leave is
+    split between the rest by weight, which is lower for bulk downloads.
+    Rates are recomputed whenever a response starts or finishes.
+    """
+
+    def __init__(self, capacity=None, pace=None, burst_seconds=None,
+                 default_rate=None, download_weight=None):
+        self.capacity = BANDWIDTH_BYTES if capacity is None else capacity
+        self.pace = PACE_MULTIPLE if pace is None else pace
+        self.burst_seconds = BURST_SECONDS if burst_seconds is None else burst_seconds
+        self.default_rate = default_rate or DEFAULT_RATE
+        self.download_weight = DOWNLOAD_WEIGHT if download_weight is None else download_weight
+        self._buckets = set()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.capacity or self.pace)
+
+    def bucket(self, priority, file_size, duration=None):
+        """TokenBucket for a 'stream' or 'download' response of a title
+
+        The bitrate is the file size over `duration` seconds when the
+        duration is known (from watch progress), else the default rate.
+        """
+        bitrate = file_size / duration if duration and duration > 0 else self.default_rate
+        if priority == 'download':
+            return TokenBucket(self, weight=self.download_weight)
+        demand = bitrate * self.pace if self.pace else None
+        return TokenBucket(self, demand=demand, burst=bitrate * self.burst_seconds)
+
+    def add(self, bucket):
+        with self._lock:
+            self._buckets.add(bucket)
+            self._rebalance()
+
+    def remove(self, bucket):
+        with self._lock:
+            self._buckets.discard(bucket)
+            self._rebalance()
+
+    def _rebalance(self):
+        """Water-fill the capacity over the active buckets (lock held)"""
+        if not self.capacity:
+            for bucket in self._buckets:
+                bucket.rate = bucket.demand or 0
+            return
+        remaining = self.capacity
+        pending = list(self._buckets)
+        while pending:
+            share = remaining / (sum(bucket.weight for bucket in pending) or 1)
+            satisfied = [bucket for bucket in pending
+                         if bucket.demand and bucket.demand <= share * bucket.weight]
+            if not satisfied:
+                for bucket in pending:
+                    bucket.rate = max(share * bucket.weight, 1)
+                return
+            for bucket in satisfied:
+                bucket.rate = bucket.demand
+                remaining -= bucket.demand
+            pending = [bucket for bucket in pending if bucket not in satisfied]
+
+    def rates(self):
+        """Current per-response rates, highest first (for monitoring)"""
+        with self._lock:
+            return sorted((bucket.rate for bucket in self._buckets), reverse=True)
+
+
+bandwidth = BandwidthScheduler()
+
+
+class StreamRejected(Exception):
+    """No stream slot became free; answer 503 with Retry-After"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class StreamSlot:
+    """One admitted media response; release() frees it (idempotent)"""
+
+    __slots__ = ('controller', 'client', 'released')
+
+    def __init__(self, controller, client):
+        self.controller = controller
+        self.client = client
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self.client)
+
+
+class AdmissionController:
+    """Caps concurrent media responses per server and per client
+
+    A request over either limit waits up to `queue_timeout` seconds in a
+    queue of at most `queue_size` for a slot, which is usually long enough
+    for the response a seeking player abandoned to be closed. When the
+    queue is full or the wait times out it is rejected with StreamRejected.
+    The counters in stats() show the load the server actually sees.
+    """
+
+    def __init__(self, max_active=None, max_per_client=None, queue_size=None,
+                 queue_timeout=None, retry_after=None):
+        self.max_active = MAX_ACTIVE_STREAMS if max_active is None else max_active
+        self.max_per_client = MAX_CLIENT_STREAMS if max_per_client is None else max_per_client
+        self.queue_size = STREAM_QUEUE_SIZE if queue_size is None else queue_size
+        self.queue_timeout = STREAM_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self.retry_after = STREAM_RETRY_AFTER if retry_after is None else retry_after
+        self.active = 0
+        self.queued = 0
+        self.peak_active = 0
+        self.admitted = 0
+        self.waited = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._clients = {}
+        self._changed = threading.Condition()
+
+    def _has_room(self, client):
+        if self.max_active and self.active >= self.max_active:
+            return False
+        return not (self.max_per_client and self._clients.get(client, 0) >= self.max_per_client)
+
+    def _take(self, client):
+        """Occupy a slot (lock held)"""
+        self.active += 1
+        self.admitted += 1
+        self.peak_active = max(self.peak_active, self.active)
+        self._clients[client] = self._clients.get(client, 0) + 1
+        return StreamSlot(self, client)
+
+    def try_admit(self, client):
+        """StreamSlot if one is free right now, else None (never waits)"""
+        with self._changed:
+            return self._take(client) if self._has_room(client) else None
+
+    def admit(self, client, timeout=None):
+        """Block until `client` may start a response; returns its StreamSlot"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        with self._changed:
+            if self._has_room(client):
+                return self._take(client)
+            if self.queued >= self.queue_size or timeout <= 0:
+                self.rejected += 1
+                logger.warning(f"Stream rejected for {client}: queue full "
+                               f"({self.active} active, {self.queued} queued)")
+                raise StreamRejected("queue full", self.retry_after)
+            self.queued += 1
+            self.waited += 1
+            try:
+                if self._changed.wait_for(lambda: self._has_room(client), timeout):
+                    return self._take(client)
+            finally:
+                self.queued -= 1
+            self.rejected += 1
+            self.timed_out += 1
+            logger.warning(f"Stream rejected for {client}: no slot within {timeout:g}s")
+            raise StreamRejected("timed out", self.retry_after)
+
+    def _release(self, client):
+        with self._changed:
+            self.active -= 1
+            count = self._clients.get(client, 0) - 1
+            if count > 0:
+                self._clients[client] = count
+            else:
+                self._clients.pop(client, None)
+            self._changed.notify_all()
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._changed:
+            return {
+                'active': self.active,
+                'queued': self.queued,
+                'peak_active': self.peak_active,
+                'admitted': self.admitted,
+                'waited': self.waited,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'clients': len(self._clients),
+                'max_active': self.max_active,
+                'max_per_client': self.max_per_client,
+            }
+
+
+admission = AdmissionController()
+
+
+def stream_stats():
+    """Admission, cache and pacing counters for the stats endpoint"""
+    stats = {'admission': admission.stats(), 'ranges': delivery_stats.stats()}
+    if file_handles is not None:
+        stats['open_files'] = {'open': len(file_handles), 'hits': file_handles.hits,
+                               'misses': file_handles.misses}
+    if chunk_cache is not None:
+        stats['chunk_cache'] = chunk_cache.stats()
+    if bandwidth.enabled:
+        stats['paced_rates'] = bandwidth.rates()
+    return stats
+
+
+class ClosingFile(io.FileIO):
+    """Unbuffered file that calls `on_close` once when it is closed
+
+    Handed to the server's file_wrapper, whose close() closes the file,
+    so the sendfile path gets the same end-of-response hook as the
+    buffered bodies. A server that knows whether the range went out in
+    full sets `delivered`; otherwise it is counted as offloaded.
+    """
+
+    def __init__(self, path, on_close=None):
+        super().__init__(path, 'rb')
+        self.on_close = on_close
+        self.delivered = None
+
+    def close(self):
+        if not self.closed:
+            delivery_stats.record(self.delivered)
+        on_close, self.on_close = self.on_close, None
+        try:
+            super().close()
+        finally:
+            if on_close is not None:
+                on_close()
+
+
+def _wrapper_honors_length(file_wrapper):
+    """Check whether the server's file_wrapper stops at Content-Length
+
+    Gunicorn sends file wrappers with sendfile() starting at the current
+    file offset and truncates at Content-Length, so it can serve any range;
+    so does async_server, which marks its wrapper with `honors_length`.
+    Other servers only get the wrapper when the range runs to end of file.
+    """
+    if getattr(file_wrapper, 'honors_length', False):
+        return True
+    return getattr(file_wrapper, '__module__', '').startswith('gunicorn')
+
+
+def can_zero_copy(environ, end, file_size):
+    """Check whether a range can be handed to the server's file_wrapper"""
+    if not ZERO_COPY_ENABLED:
+        return False
+    if environ.get('wsgi.url_scheme') == 'https':
+        # A TLS server cannot sendfile; it would iterate the wrapper with
+        # plain reads, bypassing the handle cache, chunk cache and mmap
+        return False
+    file_wrapper = environ.get('wsgi.file_wrapper')
+    if file_wrapper is None:
+        return False
+    return end == file_size - 1 or _wrapper_honors_length(file_wrapper)
+
+
+class FileRange:
+    """Iterable body that yields one byte range of a file
+
+    Reads with os.pread through the shared FileHandleCache and ChunkCache,
+    or an unbuffered file object where those are unavailable, so each
+    block is copied at most once between the kernel and the bytes object
+    handed to the server. Block sizes come from a ChunkPolicy, which is fed
+    the time the server took to drain the previous block; the chunk cache
+    does not change them. With a TokenBucket each block waits for its
+    credit before it is handed over.
+
+    Iteration stops early once a DisconnectMonitor sees the client hang
+    up, and close() releases the handle at once, however the response
+    ended; each range is counted in delivery_stats as completed or aborted.
+    """
+
+    def __init__(self, path, start, length, policy=None, stat=None, handles=None,
+                 readahead_limit=None, bucket=None, on_close=None, monitor=None):
+        self.path = path
+        self.start = start
+        self.length = length
+        self.readahead_limit = readahead_limit
+        self.policy = policy or default_chunk_policy
+        self.stat = stat
+        self.handles = file_handles if handles is None else handles
+        self.bucket = bucket
+        self.on_close = on_close
+        self.monitor = monitor
+        self.delivered = None
+        self._file = None
+        self._handle = None
+
+    def __iter__(self):
+        self.delivered = 0
+        if self.bucket is not None:
+            self.bucket.start()
+        if self.handles is not None:
+            self._handle = self.handles.acquire(self.path, self.stat)
+            fd = self._handle.fd
+            identity = self._handle.identity
+            file_size = identity[2]
+
+            if chunk_cache is not None:
+                def read(size, offset):
+                    return chunk_cache.read(identity, fd, offset, size)
+            else:
+                def read(size, offset):
+                    return os.pread(fd, size, offset)
+        else:
+            self._file = open(self.path, 'rb', buffering=0)
+            fd = self._file.fileno()
+            file_size = os.fstat(fd).st_size
+
+            def read(size, offset):
+                self._file.seek(offset)
+                return self._file.read(size)
+
+        limit = self.readahead_limit or self.start + self.length
+        readahead = ReadAhead(fd, self.start, min(limit, file_size), shared=self._handle)
+        offset = self.start
+        remaining = self.length
+        sent = 0
+        size = self.policy.first_size(remaining)
+        monitor = self.monitor
+        while remaining > 0:
+            if monitor is not None and monitor.gone():
+                break
+            began = time.monotonic()
+            readahead.advance(offset)
+            data = read(size, offset)
+            if not data:
+                break
+            offset += len(data)
+            remaining -= len(data)
+            sent += len(data)
+            if self.bucket is not None and not self.bucket.throttle(len(data), monitor):
+                break
+            yield data
+            # The generator resumes once the server has written the block
+            self.delivered = sent
+            size = self.policy.next_size(len(data), sent, time.monotonic() - began, remaining)
+        self.close()
+
+    def close(self):
+        """Release the file handle"""
+        if self.bucket is not None:
+            self.bucket.stop()
+        if self._handle is not None:
+            self.handles.release(self._handle)
+            self._handle = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.delivered is not None:
+            delivery_stats.record(self.delivered >= self.length, self.delivered)
+            self.delivered = None
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class MappedRange:
+    """Iterable body that yields one byte range from a shared memory map
+
+    The map comes from the FileHandleCache, so it is shared by every
+    request for the file and unmapped with the handle once idle. Chunks
+    are read without a syscall each. With `views=True` they are
+    memoryview slices of the map and nothing is copied in Python; that
+    is only for callers that write straight to a socket, since WSGI
+    servers require bytes, which cost one copy out of the map.
+    """
+
+    def __init__(self, path, start, length, policy=None, stat=None, handles=None,
+                 readahead_limit=None, views=False, bucket=None, on_close=None, monitor=None):
+        self.path = path
+        self.start = start
+        self.length = length
+        self.policy = policy or default_chunk_policy
+        self.stat = stat
+        self.handles = file_handles if handles is None else handles
+        self.readahead_limit = readahead_limit
+        self.views = views
+        self.bucket = bucket
+        self.on_close = on_close
+        self.monitor = monitor
+        self.delivered = None
+        self._handle = None
+
+    def __iter__(self):
+        self.delivered = 0
+        if self.bucket is not None:
+            self.bucket.start()
+        self._handle = self.handles.acquire(self.path, self.stat)
+        mapping = self.handles.mapping(self._handle)
+        if mapping is None:
+            self.close()
+            return
+        file_size = len(mapping)
+        view = memoryview(mapping) if self.views else mapping
+        limit = self.readahead_limit or self.start + self.length
+        readahead = ReadAhead(self._handle.fd, self.start, min(limit, file_size), shared=self._handle)
+        offset = self.start
+        end = min(self.start + self.length, file_size)
+        sent = 0
+        size = self.policy.first_size(end - offset)
+        monitor = self.monitor
+        try:
+            while offset < end:
+                if monitor is not None and monitor.gone():
+                    break
+                began = time.monotonic()
+                readahead.advance(offset)
+                chunk = view[offset:min(end, offset + size)]
+                offset += len(chunk)
+                sent += len(chunk)
+                if self.bucket is not None and not self.bucket.throttle(len(chunk), monitor):
+                    break
+                yield chunk
+                self.delivered = sent
+                size = self.policy.next_size(len(chunk), sent, time.monotonic() - began, end - offset)
+        finally:
+            if self.views:
+                view.release()
+        self.close()
+
+    def close(self):
+        """Release the shared handle"""
+        if self.bucket is not None:
+            self.bucket.stop()
+        if self._handle is not None:
+            self.handles.release(self._handle)
+            self._handle = None
+        if self.delivered is not None:
+            delivery_stats.record(self.delivered >= self.length, self.delivered)
+            self.delivered = None
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class MultipartRanges:
+    """multipart/byteranges body for several ranges of one file"""
+
+    def __init__(self, path, ranges, file_size, content_type, boundary=None, stat=None,
+                 bucket=None, on_close=None, monitor=None):
+        self.path = path
+        self.stat = stat
+        self.bucket = bucket
+        self.on_close = on_close
+        self.monitor = monitor
+        self.boundary = boundary or os.urandom(12).hex()
+        self.content_type = f"multipart/byteranges; boundary={self.boundary}"
+        self.parts = []
+        for start, end in ranges:
+            head = (f"\r\n--{self.boundary}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n").encode('latin-1')
+            self.parts.append((head, start, end - start + 1))
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode('latin-1')
+        self.length = sum(len(head) + length for head, _, length in self.parts) + len(self.tail)
+        self._current = None
+
+    def __iter__(self):
+        for head, start, length in self.parts:
+            if self.monitor is not None and self.monitor.gone():
+                return
+            yield head
+            self._current = buffered_range(self.path, start, length, stat=self.stat,
+                                           bucket=self.bucket, monitor=self.monitor)
+            yield from self._current
+        self._current = None
+        yield self.tail
+
+    def close(self):
+        """Release the file handle of the part being sent"""
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        if self.bucket is not None:
+            self.bucket.stop()
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+def content_disposition(name):
+    """attachment header with an ASCII fallback and the UTF-8 name"""
+    fallback = name.encode('ascii', 'replace').decode('ascii').replace('"', '')
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(name)}"
+
+
+def file_etag(st):
+    """Strong validator for a file from its size, mtime and inode"""
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}-{st.st_ino:x}"
+
+
+def evaluate_preconditions(environ, etag, last_modified):
+    """Status for failed RFC 7232 preconditions, or None to serve the file
+
+    Evaluated in the order of RFC 7232 section 6: If-Match, then
+    If-Unmodified-Since, then If-None-Match (304 for GET/HEAD, 412
+    otherwise), then If-Modified-Since.
+    """
+    safe = environ.get('REQUEST_METHOD', 'GET') in ('GET', 'HEAD')
+    if_match = environ.get('HTTP_IF_MATCH')
+    if if_match:
+        etags = parse_etags(if_match)
+        if not (etags.star_tag or etags.is_strong(etag)):
+            return 412
+    else:
+        since = parse_date(environ.get('HTTP_IF_UNMODIFIED_SINCE'))
+        if since is not None and last_modified > since.timestamp():
+            return 412
+
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        if etags.star_tag or etags.contains_weak(etag):
+            return 304 if safe else 412
+    elif safe:
+        since = parse_date(environ.get('HTTP_IF_MODIFIED_SINCE'))
+        if since is not None and last_modified <= since.timestamp():
+            return 304
+    return None
+
+
+def if_range_matches(environ, etag, last_modified):
+    """Check whether a Range request may be served as a range
+
+    Without If-Range it always may. With it, the range is only honoured
+    if the validator still matches; otherwise the client's copy is stale
+    and gets the whole file. Weak entity tags never match (RFC 7233 3.2).
+    """
+    value = environ.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.lstrip().startswith('W/'):
+        return False
+    if_range = parse_if_range_header(value)
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return int(if_range.date.timestamp()) == last_modified
+    return False
+
+
+def file_response(environ, path, content_type, cache_control=None, priority='stream',
+                  duration=None, on_close=None):
+    """Status, headers and body for a GET/HEAD of a media file
+
+    Every response carries a strong ETag and Last-Modified, so clients and
+    proxies can revalidate (304) and resume with If-Range. Range requests
+    get 206 with a single range or a multipart/byteranges body, or 416
+    with `Content-Range: bytes */size`; anything else gets the whole file
+    with 200. Bodies must be passed to a Response with
+    direct_passthrough=True.
+
+    When bandwidth pacing is enabled the body is paced as a `priority`
+    'stream' or 'download'; `duration` (seconds) gives the title's
+    bitrate for stream pacing.
+
+    `on_close` is called once the response is over: when the body is
+    closed, or before returning when there is no body to send. If this
+    raises, it is not called.
+    """
+    st = os.stat(path)
+    file_size = st.st_size
+    etag = file_etag(st)
+    last_modified = int(st.st_mtime)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': cache_control or MEDIA_CACHE_CONTROL,
+    }
+
+    status = evaluate_preconditions(environ, etag, last_modified)
+    if status is not None:
+        if status == 412:
+            # A 304 must not claim a length other than the 200's
+            headers['Content-Length'] = '0'
+        if on_close is not None:
+            on_close()
+        return status, headers, b''
+
+    range_header = environ.get('HTTP_RANGE')
+    ranges = None
+    if range_header and if_range_matches(environ, etag, last_modified):
+        try:
+            ranges = parse_range(range_header, file_size)
+        except RangeNotSatisfiable:
+            headers['Content-Range'] = f'bytes */{file_size}'
+            headers['Content-Length'] = '0'
+            if on_close is not None:
+                on_close()
+            return 416, headers, b''
+
+    bucket = bandwidth.bucket(priority, file_size, duration) if bandwidth.enabled else None
+    monitor = DisconnectMonitor.for_environ(environ)
+    if ranges is None:
+        body = range_body(environ, path, 0, file_size - 1, file_size, st, bucket, on_close,
+                          monitor)
+        headers['Content-Type'] = content_type
+        headers['Content-Length'] = str(file_size)
+        return 200, headers, body
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        body = range_body(environ, path, start, end, file_size, st, bucket, on_close, monitor)
+        headers['Content-Type'] = content_type
+        headers['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+        headers['Content-Length'] = str(end - start + 1)
+    else:
+        body = MultipartRanges(path, ranges, file_size, content_type, stat=st, bucket=bucket,
+                               on_close=on_close, monitor=monitor)
+        headers['Content-Type'] = body.content_type
+        headers['Content-Length'] = str(body.length)
+    return 206, headers, body
+
+
+def range_body(environ, path, start, end, file_size, stat=None, bucket=None, on_close=None,
+               monitor=None):
+    """Build the WSGI body for bytes start..end (inclusive) of a file
+
+    Uses the server's wsgi.file_wrapper when it can serve the range without
+    copying through Python (sendfile under gunicorn), otherwise falls back
+    to large block reads through the shared handle cache. The sendfile
+    path opens its own file, since the server moves the file offset.
+    Callers must pass the result to a Response with
+    direct_passthrough=True so the server sees the wrapper.
+
+    A paced body (`bucket`) only goes to a wrapper marked `paces`, whose
+    server meters its sends by the wrapper's `bucket`; other servers would
+    send it unthrottled, so it is read through Python instead.
+    """
+    length = end - start + 1
+    # Sequential chunked playback: prefetch beyond this range too
+    if range_history.follows(environ.get('REMOTE_ADDR'), path, start, end):
+        readahead_limit = file_size
+    else:
+        readahead_limit = end + 1
+    file_wrapper = environ.get('wsgi.file_wrapper')
+    paceable = bucket is None or getattr(file_wrapper, 'paces', False)
+    if paceable and can_zero_copy(environ, end, file_size):
+        f = ClosingFile(path, on_close)
+        try:
+            f.seek(start)
+            # The server sends it in one go; prime the cache for its start
+            ReadAhead(f.fileno(), start, readahead_limit, drop_behind=0).advance(start)
+            wrapper = file_wrapper(f, STREAM_BLOCK_SIZE)
+            if bucket is not None:
+                wrapper.bucket = bucket
+            return wrapper
+        except Exception:
+            f.close()
+            raise
+    return buffered_range(path, start, length, stat=stat, readahead_limit=readahead_limit,
+                          bucket=bucket, on_close=on_close, monitor=monitor)
+
+
+def buffered_range(path, start, length, stat=None, readahead_limit=None, bucket=None,
+                   on_close=None, monitor=None):
+    """Body for a range that is copied through Python: mmap or pread"""
+    if MMAP_ENABLED and file_handles is not None:
+        return MappedRange(path, start, length, stat=stat, readahead_limit=readahead_limit,
+                           bucket=bucket, on_close=on_close, monitor=monitor)
+    return FileRange(path, start, length, stat=stat, readahead_limit=readahead_limit,
+                     bucket=bucket, on_close=on_close, monitor=monitor)
+
+
+def sendfile_range(out_fd, path, start, length):
+    """Copy a byte range from a file to a socket with os.sendfile
+
+    Returns the number of bytes sent. Used by servers that own the client
+    socket directly; WSGI callers should use range_body instead.
+    """
+    sent = 0
+    with open(path, 'rb') as f:
+        in_fd = f.fileno()
+        while sent < length:
+            n = os.sendfile(out_fd, in_fd, start + sent, length - sent)
+            if n == 0:
+                break
+            sent += n
+    return sent
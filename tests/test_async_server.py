@@ -0,0 +1,125 @@
+"""
+Tests for the asyncio streaming server (async_server.py)
+"""
+
+import asyncio
+import threading
+import time
+
+from async_server import AsyncStreamServer
+from remux import RemuxJob
+from streaming import file_etag
+
+WRITTEN = 1000
+GROWN = 8000
+
+
+def grow_later(job, delay):
+    """Append output to a running job after `delay`, as ffmpeg would"""
+    def run():
+        time.sleep(delay)
+        with open(job.part, 'ab') as f:
+            f.write(b'x' * (GROWN - WRITTEN))
+        with job._changed:
+            job.size = GROWN
+            job._changed.notify_all()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+async def request(port, head):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(head.encode('latin-1'))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return data
+
+
+async def ticks_during(coro, interval=0.02):
+    """Run `coro` while ticking the loop; returns its result and the longest gap"""
+    gaps = []
+    done = asyncio.Event()
+
+    async def ticker():
+        last = time.monotonic()
+        while not done.is_set():
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        done.set()
+        await task
+    return result, max(gaps)
+
+
+def test_live_range_wait_does_not_block_the_loop(tmp_path):
+    source = tmp_path / 'movie.mkv'
+    source.write_bytes(b'')
+    job = RemuxJob(str(source), str(tmp_path / 'movie.mp4'))
+    with open(job.part, 'wb') as f:
+        f.write(b'x' * WRITTEN)
+    job.size = WRITTEN
+    server = AsyncStreamServer(None, lambda name: str(source), workers=2, remux=lambda path: job)
+
+    async def main():
+        await server.start('127.0.0.1', 0)
+        port = server.server.sockets[0].getsockname()[1]
+        try:
+            grow_later(job, 0.5)
+            return await ticks_during(request(
+                port, 'GET /stream/movie.mkv HTTP/1.1\r\nHost: x\r\n'
+                      'Range: bytes=5000-\r\nConnection: close\r\n\r\n'))
+        finally:
+            server.server.close()
+            await server.server.wait_closed()
+
+    try:
+        data, longest_gap = asyncio.run(main())
+    finally:
+        server.executor.shutdown(wait=False)
+        server.queue_executor.shutdown(wait=False)
+    head, _, body = data.partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 206')
+    assert b'Content-Range: bytes 5000-7999/*' in head
+    assert len(body) == GROWN - 5000
+    assert longest_gap < 0.3
+
+
+def test_not_modified_keeps_the_connection_open(tmp_path):
+    movie = tmp_path / 'movie.mp4'
+    movie.write_bytes(b'x' * WRITTEN)
+    etag = file_etag(movie.stat())
+    server = AsyncStreamServer(None, lambda name: str(movie), workers=2)
+
+    async def main():
+        await server.start('127.0.0.1', 0)
+        port = server.server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        heads = []
+        try:
+            for _ in range(2):
+                writer.write(f'GET /stream/movie.mp4 HTTP/1.1\r\nHost: x\r\n'
+                             f'If-None-Match: "{etag}"\r\n\r\n'.encode('latin-1'))
+                await writer.drain()
+                heads.append(await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5))
+        finally:
+            writer.close()
+            server.server.close()
+            await server.server.wait_closed()
+        return heads
+
+    try:
+        heads = asyncio.run(main())
+    finally:
+        server.executor.shutdown(wait=False)
+        server.queue_executor.shutdown(wait=False)
+    for head in heads:
+        assert head.startswith(b'HTTP/1.1 304')
+        assert b'Connection: keep-alive' in head
@@ -0,0 +1,106 @@
+"""
+Tests for the shared chunk cache (streaming.ChunkCache)
+"""
+
+import os
+
+import pytest
+
+import streaming
+from streaming import ChunkCache, ChunkPolicy, FileRange
+
+SEGMENT = 1000
+SIZE = 10 * SEGMENT + 37
+
+
+@pytest.fixture
+def movie(tmp_path):
+    path = tmp_path / 'movie.mp4'
+    data = bytes(i % 251 for i in range(SIZE))
+    path.write_bytes(data)
+    with open(path, 'rb') as f:
+        yield f.fileno(), (1, 2, SIZE, 3), data, str(path)
+
+
+@pytest.fixture
+def preads(monkeypatch):
+    calls = []
+    pread = os.pread
+
+    def spy(fd, size, offset):
+        calls.append((offset, size))
+        return pread(fd, size, offset)
+
+    monkeypatch.setattr(os, 'pread', spy)
+    return calls
+
+
+@pytest.mark.parametrize('offset,size', [
+    (0, 10), (990, 20), (500, 3 * SEGMENT), (SIZE - 5, 100), (SIZE, 10), (0, 2 * SIZE),
+])
+def test_read_matches_file(movie, offset, size):
+    fd, identity, data, _ = movie
+    cache = ChunkCache(max_bytes=100 * SEGMENT, segment_size=SEGMENT)
+    assert cache.read(identity, fd, offset, size) == data[offset:offset + size]
+    assert cache.read(identity, fd, offset, size) == data[offset:offset + size]
+
+
+def test_small_miss_reads_only_what_was_asked(movie, preads):
+    fd, identity, data, _ = movie
+    cache = ChunkCache(max_bytes=100 * SEGMENT, segment_size=SEGMENT)
+    assert cache.read(identity, fd, 2100, 64) == data[2100:2164]
+    assert preads == [(2100, 64)]
+    assert len(cache) == 0
+
+
+def test_covered_segments_are_kept(movie, preads):
+    fd, identity, data, _ = movie
+    cache = ChunkCache(max_bytes=100 * SEGMENT, segment_size=SEGMENT)
+    cache.read(identity, fd, 500, 3 * SEGMENT)
+    assert len(cache) == 2
+    preads.clear()
+    assert cache.read(identity, fd, 1000, 2 * SEGMENT) == data[1000:3000]
+    assert preads == []
+    assert cache.hits == 2
+
+
+def test_block_spans_cached_and_uncached_segments(movie, preads):
+    fd, identity, data, _ = movie
+    cache = ChunkCache(max_bytes=100 * SEGMENT, segment_size=SEGMENT)
+    cache.read(identity, fd, 2000, SEGMENT)
+    preads.clear()
+    assert cache.read(identity, fd, 1500, 3 * SEGMENT) == data[1500:4500]
+    assert preads == [(1500, 500), (3000, 1500)]
+
+
+def test_last_partial_segment_is_kept(movie):
+    fd, identity, data, _ = movie
+    cache = ChunkCache(max_bytes=100 * SEGMENT, segment_size=SEGMENT)
+    cache.read(identity, fd, 10 * SEGMENT, SEGMENT)
+    assert len(cache) == 1
+    assert cache.read(identity, fd, 10 * SEGMENT + 30, SEGMENT) == data[-7:]
+    assert cache.hits == 1
+
+
+def test_budget_evicts_oldest(movie):
+    fd, identity, _, _ = movie
+    cache = ChunkCache(max_bytes=2 * SEGMENT, segment_size=SEGMENT)
+    cache.read(identity, fd, 0, 4 * SEGMENT)
+    assert len(cache) == 2
+    assert cache.bytes == 2 * SEGMENT
+    assert cache.evictions == 2
+
+
+def test_policy_block_size_is_not_capped(movie, monkeypatch):
+    _, _, data, path = movie
+    if streaming.file_handles is None:
+        pytest.skip("needs the shared file handle cache")
+    monkeypatch.setattr(streaming, 'chunk_cache', ChunkCache(max_bytes=100 * SEGMENT,
+                                                             segment_size=SEGMENT))
+    body = FileRange(path, 100, 9000, policy=ChunkPolicy.fixed(4 * SEGMENT))
+    try:
+        chunks = list(body)
+    finally:
+        body.close()
+    assert [len(chunk) for chunk in chunks] == [4000, 4000, 1000]
+    assert b''.join(chunks) == data[100:9100]
@@ -0,0 +1,69 @@
+"""
+Tests for the JSON progress journal and the write-coalescing flusher
+(progress_store.py)
+"""
+
+import pytest
+
+from progress_store import ProgressFlusher, ProgressJournal
+
+
+class BrokenFile:
+    """Stands in for the journal file while the disk is full"""
+
+    def write(self, data):
+        raise OSError(28, "No space left on device")
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = ProgressJournal(str(tmp_path / 'watch_progress.json'))
+    yield journal
+    journal.close()
+
+
+def test_record_survives_reload(journal):
+    journal.record_many([('a.mp4', {'percentage': 10}), ('b.mp4', {'percentage': 20})])
+    journal.record('a.mp4', {'percentage': 30})
+    journal.close()
+    reloaded = ProgressJournal(journal.path)
+    try:
+        assert dict(reloaded) == {'a.mp4': {'percentage': 30}, 'b.mp4': {'percentage': 20}}
+    finally:
+        reloaded.close()
+
+
+def test_failed_journal_write_raises_and_keeps_nothing(journal):
+    journal.record('a.mp4', {'percentage': 10})
+    journal._journal.close()
+    journal._journal = BrokenFile()
+    with pytest.raises(OSError):
+        journal.record_many([('a.mp4', {'percentage': 50}), ('b.mp4', {'percentage': 5})])
+    assert dict(journal) == {'a.mp4': {'percentage': 10}}
+
+    # The journal is reopened on the next write
+    journal.record('b.mp4', {'percentage': 5})
+    journal.close()
+    reloaded = ProgressJournal(journal.path)
+    try:
+        assert dict(reloaded) == {'a.mp4': {'percentage': 10}, 'b.mp4': {'percentage': 5}}
+    finally:
+        reloaded.close()
+
+
+def test_flusher_retries_after_a_failed_journal_write(journal):
+    flusher = ProgressFlusher(journal)
+    flusher.record('a.mp4', {'percentage': 10})
+    journal._journal.close()
+    journal._journal = BrokenFile()
+    with pytest.raises(OSError):
+        flusher.flush()
+    assert flusher['a.mp4'] == {'percentage': 10}
+    assert 'a.mp4' not in journal
+
+    assert flusher.flush() == 1
+    assert journal['a.mp4'] == {'percentage': 10}
+    assert flusher.flush() == 0
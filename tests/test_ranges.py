@@ -0,0 +1,317 @@
+"""
+RFC 7232/7233 conformance tests for the shared range engine (streaming.py)
+"""
+
+import os
+
+import pytest
+from werkzeug.http import http_date
+
+import streaming
+from streaming import (
+    MAX_RANGES, RANGE_COALESCE_GAP, RangeNotSatisfiable,
+    evaluate_preconditions, file_etag, file_response, if_range_matches, parse_range,
+)
+
+SIZE = 10000
+MTIME = 1700000000
+
+
+@pytest.fixture
+def movie(tmp_path):
+    path = tmp_path / 'movie.mp4'
+    path.write_bytes(bytes(i % 251 for i in range(SIZE)))
+    os.utime(path, (MTIME, MTIME))
+    return str(path)
+
+
+@pytest.fixture
+def empty(tmp_path):
+    path = tmp_path / 'empty.mp4'
+    path.write_bytes(b'')
+    return str(path)
+
+
+def environ(method='GET', **headers):
+    env = {'REQUEST_METHOD': method, 'wsgi.url_scheme': 'http', 'REMOTE_ADDR': '127.0.0.1'}
+    for name, value in headers.items():
+        env['HTTP_' + name.upper()] = value
+    return env
+
+
+def get(path, method='GET', **headers):
+    """(status, headers, body bytes) of a file_response"""
+    status, response_headers, body = file_response(environ(method, **headers), path, 'video/mp4')
+    if isinstance(body, bytes):
+        return status, response_headers, body
+    try:
+        data = b''.join(bytes(chunk) for chunk in body)
+    finally:
+        body.close()
+    return status, response_headers, data
+
+
+def content(start, end):
+    return bytes(i % 251 for i in range(start, end + 1))
+
+
+class TestParseRange:
+    def test_no_header(self):
+        assert parse_range(None, SIZE) is None
+        assert parse_range('', SIZE) is None
+
+    def test_closed_range(self):
+        assert parse_range('bytes=0-499', SIZE) == [(0, 499)]
+
+    def test_open_ended_range(self):
+        assert parse_range('bytes=9500-', SIZE) == [(9500, SIZE - 1)]
+
+    def test_suffix_range(self):
+        assert parse_range('bytes=-500', SIZE) == [(SIZE - 500, SIZE - 1)]
+
+    def test_suffix_longer_than_file(self):
+        assert parse_range('bytes=-20000', SIZE) == [(0, SIZE - 1)]
+
+    def test_end_clamped_to_file(self):
+        assert parse_range('bytes=9000-20000', SIZE) == [(9000, SIZE - 1)]
+
+    def test_whitespace_and_case(self):
+        assert parse_range('Bytes= 0-9 , 5000-5009', SIZE) == [(0, 9), (5000, 5009)]
+
+    def test_empty_list_elements(self):
+        assert parse_range('bytes=,0-9,', SIZE) == [(0, 9)]
+
+    def test_multiple_ranges_sorted(self):
+        assert parse_range('bytes=5000-5009,0-9', SIZE) == [(0, 9), (5000, 5009)]
+
+    def test_overlapping_ranges_coalesced(self):
+        assert parse_range('bytes=0-499,200-999', SIZE) == [(0, 999)]
+
+    def test_adjacent_ranges_coalesced(self):
+        assert parse_range('bytes=0-99,100-199', SIZE) == [(0, 199)]
+
+    def test_ranges_within_gap_coalesced(self):
+        gap = RANGE_COALESCE_GAP
+        assert parse_range(f'bytes=0-99,{100 + gap}-{199 + gap}', SIZE) == [(0, 199 + gap)]
+        assert parse_range(f'bytes=0-99,{101 + gap}-{199 + gap}', SIZE) == [(0, 99), (101 + gap, 199 + gap)]
+
+    def test_too_many_ranges_ignored(self):
+        spec = ','.join(f'{i * 500}-{i * 500 + 9}' for i in range(MAX_RANGES + 1))
+        assert parse_range('bytes=' + spec, SIZE) is None
+
+    def test_max_ranges_accepted(self):
+        spec = ','.join(f'{i * 500}-{i * 500 + 9}' for i in range(MAX_RANGES))
+        assert len(parse_range('bytes=' + spec, SIZE)) == MAX_RANGES
+
+    @pytest.mark.parametrize('header', [
+        'items=0-9', 'bytes=', 'bytes=abc', 'bytes=9-0', 'bytes=0-9,x', 'bytes=--5', 'bytes=1-2-3',
+    ])
+    def test_invalid_headers_ignored(self, header):
+        assert parse_range(header, SIZE) is None
+
+    @pytest.mark.parametrize('header', ['bytes=10000-', 'bytes=20000-30000', 'bytes=-0'])
+    def test_unsatisfiable(self, header):
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range(header, SIZE)
+
+    def test_unsatisfiable_ranges_dropped(self):
+        assert parse_range('bytes=20000-,0-9', SIZE) == [(0, 9)]
+
+    def test_empty_file(self):
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range('bytes=0-', 0)
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range('bytes=-500', 0)
+
+
+class TestFileResponse:
+    def test_whole_file(self, movie):
+        status, headers, body = get(movie)
+        assert status == 200
+        assert headers['Accept-Ranges'] == 'bytes'
+        assert headers['Content-Length'] == str(SIZE)
+        assert body == content(0, SIZE - 1)
+
+    def test_single_range(self, movie):
+        status, headers, body = get(movie, range='bytes=100-199')
+        assert status == 206
+        assert headers['Content-Range'] == f'bytes 100-199/{SIZE}'
+        assert headers['Content-Length'] == '100'
+        assert body == content(100, 199)
+
+    def test_open_ended_range(self, movie):
+        status, headers, body = get(movie, range='bytes=9000-')
+        assert status == 206
+        assert headers['Content-Range'] == f'bytes 9000-{SIZE - 1}/{SIZE}'
+        assert body == content(9000, SIZE - 1)
+
+    def test_suffix_range(self, movie):
+        status, headers, body = get(movie, range='bytes=-500')
+        assert status == 206
+        assert headers['Content-Range'] == f'bytes {SIZE - 500}-{SIZE - 1}/{SIZE}'
+        assert headers['Content-Length'] == '500'
+        assert body == content(SIZE - 500, SIZE - 1)
+
+    def test_unsatisfiable_range(self, movie):
+        status, headers, body = get(movie, range=f'bytes={SIZE}-')
+        assert status == 416
+        assert headers['Content-Range'] == f'bytes */{SIZE}'
+        assert headers['Content-Length'] == '0'
+        assert body == b''
+
+    def test_invalid_range_gets_whole_file(self, movie):
+        status, headers, body = get(movie, range='bytes=9-0')
+        assert status == 200
+        assert len(body) == SIZE
+
+    def test_too_many_ranges_get_whole_file(self, movie):
+        spec = ','.join(f'{i * 500}-{i * 500 + 9}' for i in range(MAX_RANGES + 1))
+        status, headers, body = get(movie, range='bytes=' + spec)
+        assert status == 200
+        assert len(body) == SIZE
+
+    def test_multipart_framing(self, movie):
+        status, headers, body = get(movie, range='bytes=0-9,5000-5019,-5')
+        assert status == 206
+        content_type = headers['Content-Type']
+        assert content_type.startswith('multipart/byteranges; boundary=')
+        assert 'Content-Range' not in headers
+        assert headers['Content-Length'] == str(len(body))
+
+        boundary = content_type.split('boundary=', 1)[1].encode()
+        assert body.endswith(b'\r\n--' + boundary + b'--\r\n')
+        parts = body.split(b'\r\n--' + boundary)[1:-1]
+        expected = [(0, 9), (5000, 5019), (SIZE - 5, SIZE - 1)]
+        assert len(parts) == len(expected)
+        for part, (start, end) in zip(parts, expected):
+            head, data = part.split(b'\r\n\r\n', 1)
+            lines = head.decode('latin-1').split('\r\n')[1:]
+            assert 'Content-Type: video/mp4' in lines
+            assert f'Content-Range: bytes {start}-{end}/{SIZE}' in lines
+            assert data == content(start, end)
+
+    def test_coalesced_ranges_single_part(self, movie):
+        status, headers, body = get(movie, range='bytes=0-99,50-149')
+        assert status == 206
+        assert headers['Content-Range'] == f'bytes 0-149/{SIZE}'
+        assert body == content(0, 149)
+
+    def test_head_has_headers_without_body(self, movie):
+        status, headers, body = file_response(environ('HEAD', range='bytes=0-9'), movie, 'video/mp4')
+        try:
+            assert status == 206
+            assert headers['Content-Length'] == '10'
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    def test_validators(self, movie):
+        status, headers, _ = get(movie)
+        assert headers['ETag'] == f'"{file_etag(os.stat(movie))}"'
+        assert headers['Last-Modified'] == http_date(MTIME)
+
+    def test_empty_file(self, empty):
+        status, headers, body = get(empty)
+        assert status == 200
+        assert headers['Content-Length'] == '0'
+        assert body == b''
+
+    def test_empty_file_range(self, empty):
+        status, headers, body = get(empty, range='bytes=0-')
+        assert status == 416
+        assert headers['Content-Range'] == 'bytes */0'
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            get(str(tmp_path / 'missing.mp4'))
+
+    def test_buffered_path_without_file_wrapper(self, movie, monkeypatch):
+        monkeypatch.setattr(streaming, 'MMAP_ENABLED', False)
+        status, headers, body = file_response(environ(range='bytes=0-9'), movie, 'video/mp4')
+        try:
+            assert isinstance(body, streaming.FileRange)
+        finally:
+            body.close()
+
+
+class TestIfRange:
+    def test_no_if_range(self, movie):
+        assert if_range_matches(environ(), 'etag', MTIME)
+
+    def test_matching_etag(self, movie):
+        etag = file_etag(os.stat(movie))
+        status, headers, body = get(movie, range='bytes=0-9', if_range=f'"{etag}"')
+        assert status == 206
+        assert body == content(0, 9)
+
+    def test_stale_etag_gets_whole_file(self, movie):
+        status, headers, body = get(movie, range='bytes=0-9', if_range='"stale"')
+        assert status == 200
+        assert len(body) == SIZE
+
+    def test_weak_etag_never_matches(self, movie):
+        etag = file_etag(os.stat(movie))
+        assert not if_range_matches(environ(if_range=f'W/"{etag}"'), etag, MTIME)
+
+    def test_matching_date(self, movie):
+        status, headers, body = get(movie, range='bytes=0-9', if_range=http_date(MTIME))
+        assert status == 206
+
+    def test_other_date_gets_whole_file(self, movie):
+        status, headers, body = get(movie, range='bytes=0-9', if_range=http_date(MTIME - 60))
+        assert status == 200
+        assert len(body) == SIZE
+
+    def test_garbage_never_matches(self):
+        assert not if_range_matches(environ(if_range='not a validator'), 'etag', MTIME)
+
+
+class TestPreconditions:
+    ETAG = 'abc'
+
+    def check(self, method='GET', **headers):
+        return evaluate_preconditions(environ(method, **headers), self.ETAG, MTIME)
+
+    def test_no_conditions(self):
+        assert self.check() is None
+
+    def test_if_match(self):
+        assert self.check(if_match='"abc"') is None
+        assert self.check(if_match='*') is None
+        assert self.check(if_match='"other"') == 412
+        assert self.check(if_match='W/"abc"') == 412
+
+    def test_if_unmodified_since(self):
+        assert self.check(if_unmodified_since=http_date(MTIME)) is None
+        assert self.check(if_unmodified_since=http_date(MTIME - 60)) == 412
+
+    def test_if_match_takes_precedence_over_if_unmodified_since(self):
+        assert self.check(if_match='"abc"', if_unmodified_since=http_date(MTIME - 60)) is None
+
+    def test_if_none_match(self):
+        assert self.check(if_none_match='"abc"') == 304
+        assert self.check(if_none_match='W/"abc"') == 304
+        assert self.check(if_none_match='*') == 304
+        assert self.check(if_none_match='"other"') is None
+        assert self.check('POST', if_none_match='"abc"') == 412
+
+    def test_if_modified_since(self):
+        assert self.check(if_modified_since=http_date(MTIME)) == 304
+        assert self.check(if_modified_since=http_date(MTIME - 60)) is None
+        assert self.check('POST', if_modified_since=http_date(MTIME)) is None
+
+    def test_if_none_match_takes_precedence_over_if_modified_since(self):
+        assert self.check(if_none_match='"other"', if_modified_since=http_date(MTIME)) is None
+
+    def test_not_modified_response(self, movie):
+        etag = file_etag(os.stat(movie))
+        status, headers, body = get(movie, if_none_match=f'"{etag}"')
+        assert status == 304
+        assert body == b''
+        assert headers['ETag'] == f'"{etag}"'
+        assert 'Content-Length' not in headers
+
+    def test_precondition_failed_before_range(self, movie):
+        status, headers, body = get(movie, range='bytes=0-9', if_match='"stale"')
+        assert status == 412
+        assert headers['Content-Length'] == '0'
@@ -0,0 +1,123 @@
+"""
+Tests for the shared SQL progress store (sqlalchemy_store.py), run
+against a local SQLite database
+"""
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from library import MovieEntry
+from progress_store import ProgressFlusher
+from sqlalchemy_store import SQLAlchemyStore
+
+
+def progress(percentage, last_watched, current_time=0.0, duration=100.0):
+    return {'current_time': current_time, 'duration': duration,
+            'percentage': percentage, 'last_watched': last_watched}
+
+
+def movie(filename, size=1000, mtime=1700000000.0):
+    return MovieEntry(filename, '/movies/' + filename, size, mtime, str.lower)
+
+
+@pytest.fixture
+def url(tmp_path):
+    return f"sqlite:///{tmp_path / 'cinestream.db'}"
+
+
+@pytest.fixture
+def store(url):
+    store = SQLAlchemyStore(url, cache_ttl=0)
+    yield store
+    store.close()
+
+
+def test_record_many_upserts(store, url):
+    store.record_many([('a.mp4', progress(10, 1)), ('b.mp4', progress(50, 2))])
+    store.record_many([('a.mp4', progress(20, 3, current_time=20.0))])
+    other = SQLAlchemyStore(url, cache_ttl=0)
+    try:
+        assert len(other) == 2
+        assert other['a.mp4'] == progress(20, 3, current_time=20.0)
+        assert other['b.mp4']['percentage'] == 50
+    finally:
+        other.close()
+
+
+def test_continue_watching_and_watched(store):
+    store.record_many([
+        ('new.mp4', progress(2, 1)),
+        ('half.mp4', progress(50, 2)),
+        ('started.mp4', progress(10, 3)),
+        ('done.mp4', progress(95, 4)),
+        ('finished.mp4', progress(100, 5)),
+    ])
+    assert [name for name, _ in store.continue_watching()] == ['started.mp4', 'half.mp4']
+    assert [name for name, _ in store.continue_watching(limit=1)] == ['started.mp4']
+    assert [name for name, _ in store.watched()] == ['finished.mp4', 'done.mp4']
+
+
+def test_update_catalog(store, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('sqlalchemy_store.time.time', lambda: now[0])
+    store.update_catalog(added=[movie('old.mp4'), movie('gone.mp4')])
+    now[0] = 200.0
+    store.update_catalog(added=[movie('new.mp4')])
+    assert [row['filename'] for row in store.recently_added()][0] == 'new.mp4'
+    assert {row['filename'] for row in store.recently_added()} == {'old.mp4', 'gone.mp4', 'new.mp4'}
+
+    store.update_catalog(removed=['old.mp4'], present={'old.mp4', 'new.mp4'})
+    assert [row['filename'] for row in store.recently_added()] == ['new.mp4']
+    row = store.recently_added()[0]
+    assert (row['name'], row['size'], row['added_at']) == ('new', 1000, 200.0)
+
+
+def test_generation_sees_other_instances(store, url):
+    store.record_many([('a.mp4', progress(10, 1))])
+    before = store.generation
+    assert store.generation == before
+    other = SQLAlchemyStore(url, cache_ttl=0)
+    try:
+        other.record_many([('b.mp4', progress(30, 2))])
+    finally:
+        other.close()
+    assert store.generation != before
+    assert store['b.mp4']['percentage'] == 30
+
+
+def test_failed_write_leaves_cache_alone(store, monkeypatch):
+    store.cache_ttl = 60
+    store.record_many([('a.mp4', progress(10, 1))])
+
+    def fail(*args):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(store, '_upsert', fail)
+    with pytest.raises(RuntimeError):
+        store.record_many([('a.mp4', progress(40, 2)), ('b.mp4', progress(5, 2))])
+    assert store['a.mp4']['percentage'] == 10
+    assert 'b.mp4' not in store
+
+
+def test_flusher_puts_titles_back_when_the_write_fails(store, monkeypatch):
+    flusher = ProgressFlusher(store)
+    flusher.record('a.mp4', progress(10, 1))
+    flusher.record('b.mp4', progress(20, 1))
+    upsert = store._upsert
+
+    def fail(*args):
+        # A newer record arrives while the failing write is in flight
+        flusher.record('b.mp4', progress(25, 2))
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(store, '_upsert', fail)
+    with pytest.raises(RuntimeError):
+        flusher.flush()
+    assert flusher['a.mp4']['percentage'] == 10
+    assert flusher['b.mp4']['percentage'] == 25
+
+    monkeypatch.setattr(store, '_upsert', upsert)
+    assert flusher.flush() == 2
+    assert store['a.mp4']['percentage'] == 10
+    assert store['b.mp4']['percentage'] == 25